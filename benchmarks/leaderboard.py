@@ -0,0 +1,121 @@
+"""
+Leaderboard benchmarks
+======================
+Seeds a throwaway campaign with a million users and times the leaderboard
+endpoints against it: keyset pages at increasing depth (next to the OFFSET
+query they replace), /rank for users at the top, middle and bottom, and the
+in-memory top 10.
+
+  DATABASE_URL=postgresql://... python benchmarks/leaderboard.py
+  python benchmarks/leaderboard.py --users 200000 --limit 500
+  python benchmarks/leaderboard.py --drop          # delete the benchmark campaign afterwards
+
+Needs a Postgres database; the users are written straight into it with
+generate_series under the campaign slug "bench-leaderboard", and reused by
+later runs of the same size.
+"""
+
+import argparse, os, statistics, sys, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import main  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+SLUG = "bench-leaderboard"
+
+
+def seed(users: int) -> int:
+    """Create the benchmark campaign with exactly `users` users (95% eligible)."""
+    with main.SessionLocal() as db:
+        campaign_id = main.create_campaign(db, SLUG).id
+    with main.engine.begin() as conn:
+        count = conn.execute(text("SELECT count(*) FROM users WHERE campaign_id = :c"), {"c": campaign_id}).scalar()
+        if count != users:
+            print(f"Seeding {users:,} users...", flush=True)
+            conn.execute(text("DELETE FROM users WHERE campaign_id = :c"), {"c": campaign_id})
+            conn.execute(text("""
+                INSERT INTO users (id, name, phone, score, retries_left, eligible_for_leaderboard, campaign_id)
+                SELECT gen_random_uuid(), 'Student ' || g, 'bench-' || g, (random() * 4000)::int, 1,
+                       random() < 0.95, :c
+                FROM generate_series(1, :n) AS g
+            """), {"c": campaign_id, "n": users})
+    with main.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM ANALYZE users"))
+    return campaign_id
+
+
+def timed(fn, repeat: int) -> float:
+    """Median wall time of fn() in milliseconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main_cli(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1_000_000, help="users in the benchmark campaign")
+    parser.add_argument("--limit", type=int, default=100, help="page size")
+    parser.add_argument("--repeat", type=int, default=7, help="timing rounds per case (median is kept)")
+    parser.add_argument("--drop", action="store_true", help="delete the benchmark campaign when done")
+    args = parser.parse_args(argv)
+    if not main.SessionLocal:
+        print("DATABASE_URL is not configured")
+        return 2
+
+    campaign_id = seed(args.users)
+    db = main.SessionLocal()
+    try:
+        eligible = db.query(main.func.count()).filter(*main.on_board(campaign_id)).scalar()
+        print(f"{eligible:,} eligible users, pages of {args.limit}\n")
+        print(f"{'case':<36} {'keyset ms':>10} {'offset ms':>10}")
+
+        for depth in (0, 0.1, 0.5, 0.99):
+            offset = int(eligible * depth) // args.limit * args.limit
+            cursor = None
+            if offset:
+                last = (
+                    db.query(main.User.id, main.User.score).filter(*main.on_board(campaign_id))
+                    .order_by(main.User.score.desc(), main.User.id.desc()).offset(offset - 1).limit(1).one()
+                )
+                cursor = main.encode_cursor(last.score, last.id, offset)
+            page = main.leaderboard_page(args.limit, cursor, campaign_id, db)
+            assert page["entries"][0]["rank"] == offset + 1
+            keyset = timed(lambda: main.leaderboard_page(args.limit, cursor, campaign_id, db), args.repeat)
+            by_offset = timed(lambda: (
+                db.query(main.User.id, main.User.name, main.User.score).filter(*main.on_board(campaign_id))
+                .order_by(main.User.score.desc(), main.User.id.desc()).offset(offset).limit(args.limit).all()
+            ), args.repeat)
+            print(f"{f'page at rank {offset + 1:,}':<36} {keyset:>10.2f} {by_offset:>10.2f}")
+
+        print()
+        ranked = (
+            db.query(main.User.id).filter(*main.on_board(campaign_id))
+            .order_by(main.User.score.desc(), main.User.id.desc())
+        )
+        for label, position in (("top", 0), ("middle", eligible // 2), ("bottom", eligible - 1)):
+            user_id = str(ranked.offset(position).limit(1).scalar())
+            result = main.user_rank(user_id, 2, campaign_id, db)
+            assert result["rank"] == position + 1, (result["rank"], position + 1)
+            ms = timed(lambda: main.user_rank(user_id, 2, campaign_id, db), args.repeat)
+            print(f"{f'/rank, {label} user':<36} {ms:>10.2f}")
+
+        main.get_leaderboard(db, campaign_id)  # load the board once
+        ms = timed(lambda: main.leaderboard(campaign_id, db), args.repeat)
+        print(f"{'/leaderboard top 10 (in memory)':<36} {ms:>10.2f}")
+    finally:
+        db.close()
+
+    if args.drop:
+        with main.engine.begin() as conn:
+            conn.execute(text("DELETE FROM users WHERE campaign_id = :c"), {"c": campaign_id})
+            conn.execute(text("DELETE FROM leader_profile WHERE id = :c"), {"c": campaign_id})
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
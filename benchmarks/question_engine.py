@@ -0,0 +1,170 @@
+"""
+Question engine microbenchmarks
+===============================
+Times parse_bullets, make_wrong_options, build_questions, compile_campaign and
+generate_campaign_questions on small, typical and pathological profiles.
+
+  python benchmarks/question_engine.py            # run and compare with baseline.json
+  python benchmarks/question_engine.py --save     # record a new baseline
+  python benchmarks/question_engine.py -k parse   # only cases whose name contains "parse"
+  python benchmarks/question_engine.py --scaling  # check parse_bullets cost is linear in input size
+
+Exits non-zero when a case is slower than the baseline by more than --tolerance,
+so it can gate a deploy before a rally day. Inputs are generated from a fixed
+seed and every call gets a seeded rng, so runs are comparable.
+"""
+
+import argparse, json, os, platform, random, sys, time, timeit, tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.pop("DATABASE_URL", None)  # the engine is pure Python; never touch a real DB
+
+import main  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+WORDS = ("students hostel library fees wifi mentorship fund campus senate welfare "
+         "transport clinic sports union exams printing freshers internship").split()
+
+
+def sentence(rng: random.Random, words: int = 9) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def make_inputs() -> dict:
+    rng = random.Random(42)
+    return {
+        "small": "- Organized the 2023 inter-departmental quiz for 800 students\n"
+                 "- Secured a 30% reduction in library printing costs\n"
+                 "- Started a mentorship program pairing 200 freshers",
+        "typical": "\n".join(f"- {sentence(rng, 12)}" for _ in range(8)),
+        "manifesto_500": "\n".join(f"{i}. {sentence(rng, 14)}" for i in range(1, 501)),
+        "paragraph_200k": ". ".join(sentence(rng, 12) for _ in range(2600))[:200_000],
+        "comma_only": ", ".join(sentence(rng, 6).lower() for _ in range(400)),
+    }
+
+
+def snapshot_for(text: str) -> "main.LeaderSnapshot":
+    return main.LeaderSnapshot(
+        id=1, name="Ama Owusu", position="SRC President", achievements=text, manifesto=text,
+        personality=text, campaign_color="#e63946", slogan="", updated_at=None, version="bench",
+    )
+
+
+def make_cases(inputs: dict) -> dict:
+    cases = {}
+    for label, text in inputs.items():
+        items = main.parse_bullets(text)
+        answers = tuple(dict.fromkeys(p[:120] for p in items)) or ("placeholder option text",)
+        snapshot = snapshot_for(text)
+        main.compile_campaign(snapshot)  # serving path: compiled once per profile version
+        cases[f"parse_bullets[{label}]"] = lambda text=text: main.parse_bullets(text)
+        cases[f"make_wrong_options[{label}]"] = (
+            lambda answers=answers: main.make_wrong_options(answers, 0, random.Random(1)))
+        cases[f"build_questions[{label}]"] = (
+            lambda items=items: main.build_questions("Ama", "SRC President", items, 1, random.Random(1)))
+        cases[f"compile_campaign[{label}]"] = (  # parse + format + TF-IDF index, once per profile save
+            lambda text=text: main.compile_campaign(snapshot_for(text)))
+        cases[f"generate_campaign_questions[{label}]"] = (
+            lambda snapshot=snapshot: main.generate_campaign_questions(snapshot, 1, random.Random(1)))
+    return cases
+
+
+def measure(fn, repeat: int) -> dict:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"ops_per_sec": round(1 / best, 1), "peak_kib": round((peak - before) / 1024, 1)}
+
+
+def scaling_report(repeat: int) -> int:
+    """Time parse_bullets with the caps lifted on doubling input sizes; cost per KiB should stay flat."""
+    rng = random.Random(7)
+    shapes = {
+        "lines": lambda size: "\n".join(f"- {sentence(rng, 14)}" for _ in range(size // 80 + 1))[:size],
+        "paragraph": lambda size: ". ".join(sentence(rng, 12) for _ in range(size // 70 + 1))[:size],
+        "commas": lambda size: ", ".join(sentence(rng, 3).lower() for _ in range(size // 18 + 1))[:size],
+    }
+    unlimited = 10 ** 12
+    failed = False
+    print(f"{'shape':<12} {'size KiB':>9} {'ms':>10} {'us/KiB':>10}")
+    for shape, make_text in shapes.items():
+        per_kib = []
+        for kib in (25, 50, 100, 200, 400, 800):
+            text = make_text(kib * 1024)
+            timer = timeit.Timer(lambda: main.parse_bullets(text, unlimited, unlimited))
+            number, _ = timer.autorange()
+            seconds = min(timer.repeat(repeat=repeat, number=number)) / number
+            per_kib.append(seconds * 1e6 / kib)
+            print(f"{shape:<12} {kib:>9} {seconds * 1e3:>10.2f} {per_kib[-1]:>10.2f}")
+        spread = max(per_kib) / min(per_kib)
+        verdict = "linear" if spread < 2 else "NOT LINEAR"
+        print(f"{shape:<12} cost per KiB varies {spread:.2f}x across sizes: {verdict}\n")
+        failed |= spread >= 2
+    return 1 if failed else 0
+
+
+def main_cli(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="filter", default="", help="only run cases containing this text")
+    parser.add_argument("--repeat", type=int, default=5, help="timing rounds per case (best is kept)")
+    parser.add_argument("--save", action="store_true", help="write results to baseline.json")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown versus baseline before failing (0.25 = 25%%)")
+    parser.add_argument("--scaling", action="store_true", help="run the parse_bullets input-size scaling check")
+    args = parser.parse_args(argv)
+
+    if args.scaling:
+        return scaling_report(args.repeat)
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            baseline = json.load(f).get("results", {})
+
+    results, regressions = {}, []
+    print(f"{'case':<48} {'ops/sec':>12} {'peak KiB':>10} {'vs baseline':>12}")
+    for name, fn in make_cases(make_inputs()).items():
+        if args.filter not in name:
+            continue
+        result = results[name] = measure(fn, args.repeat)
+        change = ""
+        if name in baseline:
+            ratio = result["ops_per_sec"] / baseline[name]["ops_per_sec"]
+            change = f"{ratio:.2f}x"
+            if ratio < 1 - args.tolerance:
+                regressions.append(name)
+                change += " !"
+        print(f"{name:<48} {result['ops_per_sec']:>12,.1f} {result['peak_kib']:>10,.1f} {change:>12}")
+
+    if args.save:
+        saved = {}
+        if os.path.exists(BASELINE):
+            with open(BASELINE) as f:
+                saved = json.load(f).get("results", {})
+        saved.update(results)
+        with open(BASELINE, "w") as f:
+            json.dump({
+                "recorded": time.strftime("%Y-%m-%d"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": dict(sorted(saved.items())),
+            }, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline saved to {BASELINE}")
+    elif regressions:
+        print(f"\n{len(regressions)} case(s) regressed more than {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
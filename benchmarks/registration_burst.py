@@ -0,0 +1,101 @@
+"""
+Registration burst
+==================
+Replays what the student page does when a link lands in a big group chat:
+every student registers, prefetches their questions, starts level 1, submits
+a score and looks up their rank, with many students at once. Reports the
+throughput, how many flushes and SQL statements the burst cost, and checks
+that every registration, score and started variant reached the database.
+
+  DATABASE_URL=postgresql://... python benchmarks/registration_burst.py
+  python benchmarks/registration_burst.py --flush-ms 0      # direct inserts, for comparison
+  python benchmarks/registration_burst.py --students 5000 --concurrency 100
+
+Students register under the campaign slug "bench-register"; their rows are
+deleted at the end.
+"""
+
+import argparse, os, random, sys, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SLUG = "bench-register"
+
+
+def main_cli(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=2000, help="students in the burst")
+    parser.add_argument("--concurrency", type=int, default=50, help="students in flight at once")
+    parser.add_argument("--flush-ms", type=int, default=200, help="REGISTER_FLUSH_MS (0 = direct inserts)")
+    args = parser.parse_args(argv)
+
+    # main reads its settings at import time
+    os.environ["REGISTER_FLUSH_MS"] = str(args.flush_ms)
+    os.environ["REGISTER_JOURNAL"] = os.path.join(tempfile.mkdtemp(), "registrations.journal")
+    import main
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event, text
+
+    if not main.SessionLocal:
+        print("DATABASE_URL is not configured")
+        return 2
+    with main.SessionLocal() as db:
+        campaign_id = main.create_campaign(db, SLUG).id
+        version = main.get_leader(db, campaign_id).version
+    prefix = "020%03d" % random.randrange(1000)
+
+    flushes, statements, from_requests = [], [], []
+    write_registrations = main.write_registrations
+
+    def counted(rows):
+        flushes.append(len(rows))
+        if threading.current_thread().name.startswith(("AnyIO", "student")):
+            from_requests.append(len(rows))
+        return write_registrations(rows)
+
+    main.write_registrations = counted
+    event.listen(main.engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+
+    def student(i: int, client: TestClient):
+        base = f"/c/{SLUG}"
+        user = client.post(f"{base}/register", json={"name": f"Burst {i}", "phone": f"{prefix}{i:04d}"}).json()
+        variant = user["variants"]["1"][0]
+        assert client.get(f"{base}/questions/all?variant={variant}&v={version}").status_code == 200
+        assert client.post(f"{base}/questions/seen?user_id={user['id']}&level=1&variant={variant}").status_code == 200
+        assert client.post(f"/submit-score?user_id={user['id']}&score={100 + i}").status_code == 200
+        assert client.get(f"{base}/rank/{user['id']}").status_code == 200
+        return user["id"]
+
+    with TestClient(main.app) as client:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency, thread_name_prefix="student") as pool:
+            ids = list(pool.map(lambda i: student(i, client), range(args.students)))
+        elapsed = time.perf_counter() - start
+        burst_flushes, burst_statements = len(flushes), len(statements)
+    # leaving the client ran the shutdown hook, which drains the buffer
+
+    with main.engine.begin() as conn:
+        rows = conn.execute(text(
+            "SELECT count(*), count(*) FILTER (WHERE score >= 100), count(seen_questions)"
+            " FROM users WHERE campaign_id = :c AND phone LIKE :p"
+        ), {"c": campaign_id, "p": prefix + "%"}).one()
+        conn.execute(text("DELETE FROM users WHERE campaign_id = :c AND phone LIKE :p"),
+                     {"c": campaign_id, "p": prefix + "%"})
+    journals = [n for n in os.listdir(os.path.dirname(main.REGISTER_JOURNAL))]
+
+    print(f"{args.students:,} students, {args.concurrency} at a time, REGISTER_FLUSH_MS={args.flush_ms}")
+    print(f"  {args.students / elapsed:,.0f} students/s ({elapsed:.1f} s)")
+    print(f"  {burst_flushes} flushes during the burst, {sum(flushes[:burst_flushes]):,} rows"
+          f" (largest {max(flushes, default=0)}), {len(from_requests)} of them from a request")
+    print(f"  {burst_statements / args.students:.1f} SQL statements per student")
+    print(f"  in the database: {rows[0]:,} users, {rows[1]:,} with their score, {rows[2]:,} with their started variant")
+    print(f"  journal files left: {len(journals)}")
+    ok = rows[0] == rows[1] == rows[2] == len(set(ids)) == args.students and not journals
+    print("  OK" if ok else "  MISMATCH")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
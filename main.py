@@ -5,29 +5,87 @@ Two modes:
   1. LEADER SETUP  → /setup  (password protected, leader fills in their profile)
   2. STUDENT QUIZ  → /       (public, AI-generated questions from leader profile)
 
+Several campaigns can share one deployment: each is served under /c/<slug>/ (the
+slug is created by saving its /c/<slug>/setup page with the admin password, which
+also sets the campaign's own setup password) and, once a custom domain is saved in
+its profile, at the root of that domain.
+
+Static hosting: `python main.py export ./dist --api-base https://<app>` writes the
+quiz page, assets and question variants for a CDN; only /register, /submit-score,
+/leaderboard, /rank/{id} and POST /questions/seen then reach this app.
+
 Add to Render env vars:
   SETUP_PASSWORD   → secret password only the leader/campaign team knows
+  ADMIN_PASSWORD   → secret for creating campaigns, resetting their passwords and domains
   (DATABASE_URL and SETUP_PASSWORD)
 """
 
-import os, uuid, json, random, string
+import os, re, uuid, json, random, string, hashlib, hmac, threading, time, gzip, argparse, fcntl, bisect, base64
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field, fields, is_dataclass, replace
 from datetime import datetime, timezone, timedelta
 
-from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 
-from sqlalchemy import create_engine, Column, String, Integer, Boolean, DateTime, Text
+from sqlalchemy import create_engine, text, update, values, column, tuple_, case, and_, Column, Index, String, Integer, Boolean, DateTime, Text, LargeBinary
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import UUID, insert as pg_insert
 from sqlalchemy.sql import func
 
 from apscheduler.schedulers.background import BackgroundScheduler
 from pydantic import BaseModel
 
+try:
+    import brotli
+except ImportError:  # optional: gzip is always available
+    brotli = None
+
+try:
+    import numpy as np
+except ImportError:  # optional: distractors fall back to random pool items
+    np = None
+
 # ─── ENV ──────────────────────────────────────────────────────────────────────
 DATABASE_URL = os.getenv("DATABASE_URL", "")
-SETUP_PASSWORD = os.getenv("SETUP_PASSWORD", "campaign2024")
+SETUP_PASSWORD = os.getenv("SETUP_PASSWORD", "campaign2024")  # default campaign, until it has its own
+# Creates campaigns, (re)sets their setup passwords and custom domains; empty disables all three
+ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "")
+# Comma-separated hosts the deployment itself answers on; never given to a campaign as its domain
+APP_HOSTNAMES = {h.strip().lower() for h in os.getenv("APP_HOSTNAMES", "").split(",") if h.strip()}
+# How often a worker re-checks leader_profile.updated_at for saves made by other workers
+LEADER_CHECK_SECONDS = float(os.getenv("LEADER_CHECK_SECONDS", "5"))
+# Browser freshness window for rendered pages; after it they revalidate with If-None-Match
+PAGE_MAX_AGE = int(os.getenv("PAGE_MAX_AGE", "60"))
+# Pre-shuffled question sets generated per level each time the profile is saved
+QUESTION_BANK_SIZE = int(os.getenv("QUESTION_BANK_SIZE", "20"))
+# Upper bounds on how much profile text is parsed into question items
+PARSE_MAX_CHARS = int(os.getenv("PARSE_MAX_CHARS", "100000"))
+PARSE_MAX_ITEMS = int(os.getenv("PARSE_MAX_ITEMS", "200"))
+# Memory for cached campaign pages and question banks; least recently used campaigns go first
+CAMPAIGN_CACHE_MB = float(os.getenv("CAMPAIGN_CACHE_MB", "64"))
+# Users whose best score is remembered in memory to skip submissions that cannot raise it
+BEST_SCORE_CACHE_SIZE = int(os.getenv("BEST_SCORE_CACHE_SIZE", "100000"))
+# Coalesce score submissions per user and write them every SCORE_FLUSH_MS (0 = write each one)
+SCORE_FLUSH_MS = int(os.getenv("SCORE_FLUSH_MS", "0"))
+# Leaderboard entries held in memory per campaign (the page shows the top 10), and how
+# often they are re-read so scores written by other workers show up
+LEADERBOARD_KEEP = int(os.getenv("LEADERBOARD_KEEP", "100"))
+LEADERBOARD_SYNC_SECONDS = float(os.getenv("LEADERBOARD_SYNC_SECONDS", "30"))
+# Seconds the serialized top 10 is served before one request re-reads it from the database
+# (the others get the previous copy meanwhile); a new top-10 score replaces it at once
+LEADERBOARD_TTL_SECONDS = float(os.getenv("LEADERBOARD_TTL_SECONDS", "5"))
+# Country calling code assumed for phone numbers typed without one (Ghana)
+PHONE_COUNTRY_CODE = os.getenv("PHONE_COUNTRY_CODE", "233")
+# Digits of a number in that country after the country code or trunk 0 (Ghana: 24 412 3456)
+PHONE_NATIONAL_DIGITS = int(os.getenv("PHONE_NATIONAL_DIGITS", "9"))
+# Write-behind registration: batch inserts every REGISTER_FLUSH_MS (0 = insert each one directly)
+REGISTER_FLUSH_MS = int(os.getenv("REGISTER_FLUSH_MS", "0"))
+REGISTER_BUFFER_MAX = int(os.getenv("REGISTER_BUFFER_MAX", "10000"))
+# Append-only journal of buffered registrations, replayed after a crash
+REGISTER_JOURNAL = os.getenv("REGISTER_JOURNAL", "registrations.journal")
 
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
@@ -42,18 +100,32 @@ class User(Base):
     __tablename__ = "users"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String)
-    phone = Column(String)
+    phone = Column(String)       # as typed
+    phone_e164 = Column(String)  # normalize_phone(phone); one user per number per campaign
     score = Column(Integer, default=0)
     referral_code = Column(String, unique=True)
     referred_by = Column(String)
     retries_left = Column(Integer, default=1)
     eligible_for_leaderboard = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    campaign_id = Column(Integer, nullable=False, default=1, server_default="1", index=True)
+    # Bitset of the question bank variants this user has started (see next_variants)
+    seen_questions = Column(LargeBinary)
+    seen_version = Column(String)  # LeaderSnapshot.version the bits refer to
+
+    __table_args__ = (
+        Index("uq_users_campaign_phone", "campaign_id", "phone_e164", unique=True),
+        # Leaderboard order is (score, id) descending; backs ranks, neighbours and the board
+        Index("ix_users_board", "campaign_id", "score", "id", postgresql_where=eligible_for_leaderboard),
+    )
 
 
 class LeaderProfile(Base):
     __tablename__ = "leader_profile"
-    id = Column(Integer, primary_key=True, default=1)
+    id = Column(Integer, primary_key=True, default=1)  # campaign id; 1 is the default campaign
+    slug = Column(String, unique=True)       # served under /c/<slug>/
+    hostname = Column(String, unique=True)   # custom domain served at its root
+    setup_password = Column(String)          # hash_password() of this campaign's setup password
     name = Column(String, default="")
     position = Column(String, default="")
     achievements = Column(Text, default="")   # Level 1 source
@@ -64,8 +136,88 @@ class LeaderProfile(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
 
+class QuestionBank(Base):
+    __tablename__ = "question_bank"
+    version = Column(String, primary_key=True)  # LeaderSnapshot.version the sets were built from
+    payload = Column(Text, nullable=False)      # JSON {"1": [[question, ...], ...], "2": ..., "3": ...}
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    campaign_id = Column(Integer, nullable=False, default=1, server_default="1")
+
+
+class AppSetting(Base):
+    """Deployment-wide values generated once and shared by every worker."""
+    __tablename__ = "app_setting"
+    name = Column(String, primary_key=True)
+    value = Column(String, nullable=False)
+
+
+# Referral serials are handed out in blocks: each nextval reserves this many
+REFERRAL_BLOCK = 100
+
+# create_all only adds missing tables; columns and indexes added to existing ones
+# since the first deploy are brought in here as (relation, column, statement).
+# upgrade_schema runs a statement only while the catalog lacks its column, or its
+# relation when the column is None.
+SCHEMA_UPGRADES = [
+    ("leader_profile", "slug", "ALTER TABLE leader_profile ADD COLUMN IF NOT EXISTS slug VARCHAR UNIQUE"),
+    ("leader_profile", "hostname", "ALTER TABLE leader_profile ADD COLUMN IF NOT EXISTS hostname VARCHAR UNIQUE"),
+    ("leader_profile", "setup_password", "ALTER TABLE leader_profile ADD COLUMN IF NOT EXISTS setup_password VARCHAR"),
+    ("users", "campaign_id", "ALTER TABLE users ADD COLUMN IF NOT EXISTS campaign_id INTEGER NOT NULL DEFAULT 1"),
+    ("ix_users_campaign_id", None, "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_campaign_id ON users (campaign_id)"),
+    ("question_bank", "campaign_id",
+     "ALTER TABLE question_bank ADD COLUMN IF NOT EXISTS campaign_id INTEGER NOT NULL DEFAULT 1"),
+    ("users", "seen_questions", "ALTER TABLE users ADD COLUMN IF NOT EXISTS seen_questions BYTEA"),
+    ("users", "seen_version", "ALTER TABLE users ADD COLUMN IF NOT EXISTS seen_version VARCHAR"),
+    ("referral_code_seq", None, f"CREATE SEQUENCE IF NOT EXISTS referral_code_seq INCREMENT BY {REFERRAL_BLOCK}"),
+    ("users", "phone_e164", "ALTER TABLE users ADD COLUMN IF NOT EXISTS phone_e164 VARCHAR"),
+    ("uq_users_campaign_phone", None,
+     "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_users_campaign_phone ON users (campaign_id, phone_e164)"),
+    ("ix_users_board", None,
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_board ON users (campaign_id, score, id)"
+     " WHERE eligible_for_leaderboard"),
+]
+# pg_try_advisory_lock key held while upgrading, so workers starting together take turns
+SCHEMA_LOCK_KEY = 0x5157_0001
+
+
+def missing_upgrades(conn) -> list:
+    """The SCHEMA_UPGRADES this database still lacks; an index left invalid by a failed build counts as missing."""
+    columns = set(conn.execute(text(
+        "SELECT table_name, column_name FROM information_schema.columns WHERE table_schema = current_schema()"
+    )))
+    relations = set(conn.execute(text(
+        "SELECT c.relname FROM pg_class c LEFT JOIN pg_index i ON i.indexrelid = c.oid"
+        " WHERE c.relnamespace = current_schema()::regnamespace AND i.indisvalid IS NOT FALSE"
+    )).scalars())
+    return [(relation, name, statement) for relation, name, statement in SCHEMA_UPGRADES
+            if ((relation, name) not in columns if name else relation not in relations)]
+
+
+def upgrade_schema():
+    """Apply the missing SCHEMA_UPGRADES; on an up-to-date database only reads the catalog.
+
+    Statements run outside a transaction, one by one, because CREATE INDEX
+    CONCURRENTLY cannot run inside one; the index builds let registrations
+    go on meanwhile. The advisory lock is polled, not waited on: a backend
+    blocked on it would hold a snapshot the concurrent build has to wait out.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if not missing_upgrades(conn):
+            return
+        while not conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": SCHEMA_LOCK_KEY}).scalar():
+            time.sleep(0.5)
+        try:
+            for relation, name, statement in missing_upgrades(conn):  # another worker may have done some
+                if name is None and " INDEX " in statement:  # an invalid leftover would satisfy IF NOT EXISTS
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {relation}"))
+                conn.execute(text(statement))
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SCHEMA_LOCK_KEY})
+
+
 if engine:
     Base.metadata.create_all(bind=engine)
+    upgrade_schema()
 
 
 def get_db():
@@ -79,173 +231,737 @@ def get_db():
 
 
 # ─── HELPERS ──────────────────────────────────────────────────────────────────
-def generate_referral_code():
-    return "".join(random.choices(string.ascii_uppercase + string.digits, k=8))
+REFERRAL_ALPHABET = string.ascii_uppercase + string.digits
+REFERRAL_HALF = len(REFERRAL_ALPHABET) ** 4  # the 36^8 code space as two 36^4 halves
+REFERRAL_ROUNDS = 8
+
+_referral_lock = threading.Lock()
+_referral_next = _referral_end = 0  # current block of serials: [next, end)
+
+
+def referral_code(serial: int, key: bytes) -> str:
+    """Encrypt a serial into an 8-character code with a keyed Feistel network over 36^8.
+
+    Every round is invertible, so distinct serials always give distinct codes and
+    no lookup is needed; without the key, consecutive codes look unrelated.
+    """
+    left, right = divmod(serial % REFERRAL_HALF ** 2, REFERRAL_HALF)
+    for round_ in range(REFERRAL_ROUNDS):
+        digest = hashlib.blake2b(b"%d:%d" % (round_, right), digest_size=8, key=key).digest()
+        left, right = right, (left + int.from_bytes(digest, "big")) % REFERRAL_HALF
+    value = left * REFERRAL_HALF + right
+    chars = []
+    for _ in range(8):
+        value, digit = divmod(value, len(REFERRAL_ALPHABET))
+        chars.append(REFERRAL_ALPHABET[digit])
+    return "".join(reversed(chars))
+
+
+def load_referral_key() -> bytes:
+    """The referral permutation key, generated once per database and kept in app_setting.
+
+    Codes are only distinct while the key stays the same, so it is stored rather
+    than configured; the first worker to start writes a random one.
+    """
+    with engine.begin() as conn:
+        conn.execute(
+            pg_insert(AppSetting).values(name="referral_code_key", value=os.urandom(32).hex())
+            .on_conflict_do_nothing()
+        )
+        return bytes.fromhex(
+            conn.execute(text("SELECT value FROM app_setting WHERE name = 'referral_code_key'")).scalar()
+        )
+
+
+_referral_key = load_referral_key() if engine else None
+
+
+def generate_referral_code(db: Session) -> str:
+    """Next unique code; only one in REFERRAL_BLOCK calls touches the database."""
+    global _referral_next, _referral_end
+    with _referral_lock:
+        if _referral_next >= _referral_end:
+            _referral_next = db.execute(text("SELECT nextval('referral_code_seq')")).scalar()
+            _referral_end = _referral_next + REFERRAL_BLOCK
+        serial = _referral_next
+        _referral_next += 1
+    return referral_code(serial, _referral_key)
+
+
+PASSWORD_ITERATIONS = 200_000
+
+
+def hash_password(password: str) -> str:
+    """Salted PBKDF2-SHA256, stored as "iterations$salt$digest"."""
+    salt = os.urandom(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, PASSWORD_ITERATIONS)
+    return f"{PASSWORD_ITERATIONS}${salt.hex()}${digest.hex()}"
+
+
+def check_password(password: str, stored: str) -> bool:
+    iterations, salt, digest = stored.split("$")
+    attempt = hashlib.pbkdf2_hmac("sha256", password.encode(), bytes.fromhex(salt), int(iterations))
+    return hmac.compare_digest(attempt.hex(), digest)
+
+
+def is_admin(password: str | None) -> bool:
+    return bool(ADMIN_PASSWORD and password) and hmac.compare_digest(password.encode(), ADMIN_PASSWORD.encode())
+
+
+def normalize_phone(phone: str) -> str:
+    """E.164 form of a phone number; numbers without a country code get PHONE_COUNTRY_CODE.
+
+    "024 412 3456", "24 412 3456", "233244123456", "+233 24 412 3456",
+    "00233244123456" → "+233244123456". Numbers in PHONE_COUNTRY_CODE must have
+    PHONE_NATIONAL_DIGITS digits after it; other countries' numbers only the
+    8 to 15 digits E.164 allows.
+    """
+    digits = re.sub(r"\D", "", phone)
+    if phone.strip().startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith(PHONE_COUNTRY_CODE) and len(digits) > PHONE_NATIONAL_DIGITS + 1:
+        pass  # checked below
+    elif len(digits) == PHONE_NATIONAL_DIGITS + digits.startswith("0"):  # with or without the trunk 0
+        digits = PHONE_COUNTRY_CODE + digits.removeprefix("0")
+    else:
+        digits = ""
+    if digits.startswith(PHONE_COUNTRY_CODE):
+        national = digits[len(PHONE_COUNTRY_CODE):].removeprefix("0")  # "+233 024 ..." keeps its trunk 0
+        digits = PHONE_COUNTRY_CODE + national if len(national) == PHONE_NATIONAL_DIGITS else ""
+    if not 8 <= len(digits) <= 15:
+        raise HTTPException(status_code=400, detail="Please enter a valid phone number")
+    return "+" + digits
+
+
+def backfill_phone_e164():
+    """Fill phone_e164 for users registered before it existed, once per database.
+
+    A number gets its normalized form only if no other user in its campaign has
+    the same one; duplicates registered before the unique index, and numbers
+    normalize_phone rejects, stay NULL. Registrations wait on the table lock
+    until the backfill commits, so none can claim a number halfway through.
+    """
+    with engine.begin() as conn:  # the marker is rolled back with the rest if anything fails
+        claimed = conn.execute(
+            pg_insert(AppSetting).values(name="phone_e164_backfill", value=datetime.now(timezone.utc).isoformat())
+            .on_conflict_do_nothing().returning(AppSetting.name)
+        ).first()
+        if claimed is None:
+            return  # done already, or another worker is doing it
+        conn.execute(text("LOCK TABLE users IN SHARE ROW EXCLUSIVE MODE"))
+        numbers, pending = Counter(), []
+        for user_id, campaign_id, phone, phone_e164 in conn.execute(
+            text("SELECT id, campaign_id, phone, phone_e164 FROM users")
+        ):
+            if phone_e164 is None:
+                try:
+                    phone_e164 = normalize_phone(phone or "")
+                except HTTPException:
+                    continue
+                pending.append((user_id, campaign_id, phone_e164))
+            numbers[campaign_id, phone_e164] += 1
+        unique = [(user_id, phone_e164) for user_id, campaign_id, phone_e164 in pending
+                  if numbers[campaign_id, phone_e164] == 1]
+        for i in range(0, len(unique), WRITE_BATCH_ROWS):
+            fill = values(
+                column("id", UUID(as_uuid=True)), column("phone_e164", String), name="fill"
+            ).data(unique[i:i + WRITE_BATCH_ROWS])
+            conn.execute(update(User).where(User.id == fill.c.id).values(phone_e164=fill.c.phone_e164))
+
+
+# ─── LEADER PROFILE CACHE ─────────────────────────────────────────────────────
+DEFAULT_CAMPAIGN_ID = 1  # served for any host without a campaign of its own
+BANK_FORMAT = 2  # part of every version; bump when the stored question banks change shape
+SLUG = re.compile(r"[a-z0-9][a-z0-9-]{0,62}")
+
+
+@dataclass(frozen=True)
+class LeaderSnapshot:
+    """Immutable in-memory copy of the leader_profile row, shared by every request."""
+    id: int
+    name: str
+    position: str
+    achievements: str
+    manifesto: str
+    personality: str
+    campaign_color: str
+    slogan: str
+    updated_at: datetime | None
+    version: str  # content hash, identical across workers for identical profiles
+    slug: str | None = None
+    cache: dict = field(default_factory=dict, compare=False, repr=False)  # artifacts derived from this version
+
+    @classmethod
+    def from_row(cls, row: LeaderProfile) -> "LeaderSnapshot":
+        values = [row.name, row.position, row.achievements, row.manifesto,
+                  row.personality, row.campaign_color, row.slogan]
+        version = hashlib.sha256(json.dumps([BANK_FORMAT, row.id, *values]).encode()).hexdigest()[:16]
+        return cls(row.id, *values, updated_at=row.updated_at, version=version, slug=row.slug)
+
+
+@dataclass
+class CampaignEntry:
+    snapshot: LeaderSnapshot
+    checked_at: float  # time.monotonic() of the last updated_at check
+    size: int          # bytes charged for the snapshot, its cached artifacts and the board
+    board: "Leaderboard | None" = None  # outlives snapshots: scores do not depend on the profile
+
+
+class CampaignCache:
+    """Snapshots of recently used campaigns, evicting the least recently used past max_bytes.
+
+    Artifacts built from a snapshot (pages, question banks) are charged to its
+    campaign as they are cached, so one busy campaign cannot push out more than
+    its share. The most recently used campaign is never evicted.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[int, CampaignEntry] = OrderedDict()
+        self.size = 0
+
+    def get(self, campaign_id: int) -> CampaignEntry | None:
+        with self.lock:
+            entry = self.entries.get(campaign_id)
+            if entry is not None:
+                self.entries.move_to_end(campaign_id)
+            return entry
+
+    def publish(self, snapshot: LeaderSnapshot) -> LeaderSnapshot:
+        entry = CampaignEntry(snapshot, time.monotonic(), footprint(snapshot))
+        with self.lock:
+            old = self.entries.pop(snapshot.id, None)
+            if old is not None and old.board is not None:
+                entry.board = old.board
+                entry.size += footprint(old.board.entries)
+            self.size += entry.size - (old.size if old else 0)
+            self.entries[snapshot.id] = entry
+            self._evict()
+        return snapshot
+
+    def peek(self, campaign_id: int) -> CampaignEntry | None:
+        """The entry if cached, without counting as a use."""
+        with self.lock:
+            return self.entries.get(campaign_id)
+
+    def charge(self, snapshot: LeaderSnapshot, size: int):
+        with self.lock:
+            entry = self.entries.get(snapshot.id)
+            if entry is None or entry.snapshot is not snapshot:
+                return  # replaced or evicted meanwhile; the artifact goes with the old snapshot
+            entry.size += size
+            self.size += size
+            self.entries.move_to_end(snapshot.id)
+            self._evict()
+
+    def _evict(self):
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            _, entry = self.entries.popitem(last=False)
+            self.size -= entry.size
+
+
+def footprint(value) -> int:
+    """Rough size of a cached value in bytes: the text and encoded bodies it holds."""
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, PreparedPage):
+        return sum(len(body) for body, _ in value.variants.values())
+    if isinstance(value, dict):
+        return sum(footprint(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(footprint(v) for v in value)
+    if is_dataclass(value):
+        return sum(footprint(getattr(value, f.name)) for f in fields(value) if f.name != "cache")
+    return 0
+
+
+campaigns = CampaignCache(int(CAMPAIGN_CACHE_MB * 1024 * 1024))
+
+
+@dataclass(frozen=True)
+class CampaignRoutes:
+    slugs: dict       # slug -> campaign id
+    hosts: dict       # hostname -> campaign id
+    loaded_at: float  # time.monotonic()
+
+
+_campaign_routes = CampaignRoutes({}, {}, float("-inf"))
+
+
+def load_campaign_routes(db: Session) -> CampaignRoutes:
+    global _campaign_routes
+    rows = db.query(LeaderProfile.id, LeaderProfile.slug, LeaderProfile.hostname).all()
+    _campaign_routes = CampaignRoutes(
+        slugs={slug: id_ for id_, slug, _ in rows if slug},
+        hosts={host: id_ for id_, _, host in rows if host},
+        loaded_at=time.monotonic(),
+    )
+    return _campaign_routes
+
+
+def resolve_campaign(request: Request, db: Session = Depends(get_db)) -> int:
+    """Campaign id for a request: the /c/<slug>/ prefix, else the Host header, else the default.
+
+    The slug and hostname table is a handful of rows, re-read at most once per
+    LEADER_CHECK_SECONDS, so routing costs no query per request.
+    """
+    routes = _campaign_routes
+    if time.monotonic() - routes.loaded_at >= LEADER_CHECK_SECONDS:
+        routes = load_campaign_routes(db)
+    slug = request.path_params.get("slug")
+    if slug is not None:
+        campaign_id = routes.slugs.get(slug.lower())
+        if campaign_id is None:
+            raise HTTPException(status_code=404, detail="Campaign not found")
+        return campaign_id
+    host = request.headers.get("host", "").rsplit(":", 1)[0].lower()
+    return routes.hosts.get(host, DEFAULT_CAMPAIGN_ID)
+
+
+def load_leader_row(db: Session, campaign_id: int = DEFAULT_CAMPAIGN_ID) -> LeaderProfile:
+    """Fetch a campaign's profile row, creating the default one with an atomic upsert on first boot."""
+    leader = db.get(LeaderProfile, campaign_id)
+    if leader is None and campaign_id == DEFAULT_CAMPAIGN_ID:
+        db.execute(
+            pg_insert(LeaderProfile)
+            .values(id=DEFAULT_CAMPAIGN_ID)
+            .on_conflict_do_nothing(index_elements=[LeaderProfile.id])
+        )
+        db.commit()
+        leader = db.get(LeaderProfile, campaign_id)
+    if leader is None:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return leader
 
 
-def get_leader(db: Session) -> LeaderProfile:
-    leader = db.query(LeaderProfile).first()
-    if not leader:
-        leader = LeaderProfile(id=1)
-        db.add(leader)
+def create_campaign(db: Session, slug: str, password: str | None = None) -> LeaderProfile:
+    """Return the profile row for slug, adding it under the next free id if it is new.
+
+    A new campaign gets `password` as its setup password; an existing one keeps its own.
+    """
+    password_hash = hash_password(password) if password else None
+    for _ in range(3):  # two first saves of different slugs can pick the same id; the loser retries
+        leader = db.query(LeaderProfile).filter(LeaderProfile.slug == slug).first()
+        if leader is not None:
+            return leader
+        next_id = db.query(func.coalesce(func.max(LeaderProfile.id), DEFAULT_CAMPAIGN_ID) + 1).scalar_subquery()
+        db.execute(
+            pg_insert(LeaderProfile).values(id=next_id, slug=slug, setup_password=password_hash).on_conflict_do_nothing()
+        )
         db.commit()
-        db.refresh(leader)
-    return leader
+    raise HTTPException(status_code=409, detail="Could not create campaign, please retry")
+
+
+def publish_leader(row: LeaderProfile) -> LeaderSnapshot:
+    return campaigns.publish(LeaderSnapshot.from_row(row))
+
+
+def get_leader(db: Session, campaign_id: int = DEFAULT_CAMPAIGN_ID) -> LeaderSnapshot:
+    """Return the cached profile; at most one cheap updated_at probe per LEADER_CHECK_SECONDS."""
+    entry = campaigns.get(campaign_id)
+    if entry is not None and time.monotonic() - entry.checked_at < LEADER_CHECK_SECONDS:
+        return entry.snapshot
+
+    if entry is not None:
+        updated_at = db.query(LeaderProfile.updated_at).filter(LeaderProfile.id == campaign_id).scalar()
+        if updated_at is not None and updated_at == entry.snapshot.updated_at:
+            entry.checked_at = time.monotonic()
+            return entry.snapshot
+
+    return publish_leader(load_leader_row(db, campaign_id))
+
+
+def cached(snapshot: LeaderSnapshot, key: str, build):
+    """Build an artifact once per profile version; racing threads may both build, one wins."""
+    value = snapshot.cache.get(key)
+    if value is None:
+        built = build()
+        value = snapshot.cache.setdefault(key, built)
+        if value is built:
+            campaigns.charge(snapshot, footprint(built))
+    return value
+
+
+# ─── PRE-RENDERED PAGES ───────────────────────────────────────────────────────
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+class PreparedPage:
+    """A response body encoded and compressed once, served with strong ETags / 304s.
+
+    Each content-coding gets its own ETag suffix so caches never mix up variants.
+    """
+
+    def __init__(self, body: str, media_type: str = "text/html; charset=utf-8",
+                 cache_control: str = f"public, max-age={PAGE_MAX_AGE}, must-revalidate"):
+        self.media_type = media_type
+        self.cache_control = cache_control
+        raw = body.encode()
+        tag = hashlib.sha256(raw).hexdigest()[:32]
+        self.variants = {"identity": (raw, f'"{tag}"')}
+        compressed = {"gzip": gzip.compress(raw, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            compressed["br"] = brotli.compress(raw, quality=11)
+        for coding, data in compressed.items():
+            if len(data) < len(raw):
+                self.variants[coding] = (data, f'"{tag}-{coding}"')
+
+    @property
+    def body(self) -> bytes:
+        return self.variants["identity"][0]
+
+    @property
+    def etag(self) -> str:
+        return self.variants["identity"][1]
+
+    def respond(self, request: Request, cache_control: str | None = None) -> Response:
+        coding = negotiate_encoding(request.headers.get("accept-encoding"), self.variants)
+        body, etag = self.variants[coding]
+        headers = {"ETag": etag, "Cache-Control": cache_control or self.cache_control, "Vary": "Accept-Encoding"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        if coding != "identity":
+            headers["Content-Encoding"] = coding
+        return Response(content=body, media_type=self.media_type, headers=headers)
+
+
+def negotiate_encoding(accept_encoding: str | None, available) -> str:
+    """Pick the best precompressed variant the client accepts (br > gzip > identity)."""
+    weights = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            weights[coding] = q
+    best, best_q = "identity", 0.0
+    for coding in ("br", "gzip"):
+        q = weights.get(coding, weights.get("*", 0.0))
+        if coding in available and q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
 
 
 # ─── SMART TEMPLATE QUESTION ENGINE ─────────────────────────────────────────
-def parse_bullets(text: str) -> list:
-    """Extract meaningful points from any text format — bullets, sentences, paragraphs."""
-    import re
-    items = []
+# The characters str.splitlines breaks on
+LINE_BREAKS = "\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029"
+# Line breaks plus the sentence breaks [.!?]+ and ,{2,}. Every branch starts with a
+# literal so the regex engine can skip ahead to candidate characters.
+LINE_OR_SENTENCE_BREAK = re.compile(
+    r"\r\n?|\n|\v|\f|\x1c|\x1d|\x1e|\x85|\u2028|\u2029|\.[.!?]*|![.!?]*|\?[.!?]*|,,+"
+)
+
+
+def iter_bullets(text: str, max_chars: int | None = None, max_items: int | None = None):
+    """Yield meaningful points from any text format — bullets, sentences, paragraphs.
+
+    Lines win, then sentences, then comma-separated parts, exactly as the old
+    three-pass parser decided. Lines and sentences are collected in one scan and
+    line items are yielded as soon as they are found. The scan drops sentence
+    tracking once two lines qualify (sentences can no longer be used) or once
+    max_items sentences are held, and reads the rest with splitlines. Comma parts
+    are only split out when neither lines nor sentences produced two items. Input
+    beyond max_chars is ignored and no more than max_items unique items are yielded.
+    """
+    max_chars = PARSE_MAX_CHARS if max_chars is None else max_chars
+    max_items = PARSE_MAX_ITEMS if max_items is None else max_items
+    end = min(len(text), max_chars)
+    seen = set()
+    lines = 0  # qualifying lines before dedup, which is what the fallback decision counts
+    sentences = []
+    line_start = sentence_start = 0
+
+    for m in LINE_OR_SENTENCE_BREAK.finditer(text, 0, end):
+        if text[m.start()] in LINE_BREAKS:
+            line = text[line_start:m.start()].strip().lstrip("-•*0123456789.)").strip()
+            line_start = m.end()
+            if len(line) > 20:
+                lines += 1
+                if line not in seen:
+                    seen.add(line)
+                    yield line
+                    if len(seen) >= max_items:
+                        return
+                if lines == 2:
+                    break
+        else:
+            sentence = text[sentence_start:m.start()].strip().lstrip("-•*").strip()
+            sentence_start = m.end()
+            if len(sentence) > 20:
+                sentences.append(sentence)
+                if len(sentences) >= max_items:
+                    break
+    else:
+        sentence = text[sentence_start:end].strip().lstrip("-•*").strip()
+        if len(sentence) > 20:
+            sentences.append(sentence)
 
-    # First try bullet points / numbered lines
-    for line in text.splitlines():
+    for line in text[line_start:end].splitlines():
         line = line.strip().lstrip("-•*0123456789.)").strip()
         if len(line) > 20:
-            items.append(line)
-
-    # If not enough lines, split by sentence punctuation
-    if len(items) < 2:
-        sentences = re.split(r'[.!?]+|,{2,}', text)
-        for s in sentences:
-            s = s.strip().lstrip("-•*").strip()
-            if len(s) > 20:
-                items.append(s)
-
-    # If still not enough, split by commas
-    if len(items) < 2:
-        parts = text.split(",")
-        for p in parts:
-            p = p.strip()
-            if len(p) > 20:
-                items.append(p)
-
-    # Deduplicate while preserving order
-    seen = set()
-    unique = []
-    for item in items:
+            lines += 1
+            if line not in seen:
+                seen.add(line)
+                yield line
+                if len(seen) >= max_items:
+                    return
+    if lines >= 2:
+        return
+
+    # Not enough lines: fall back to sentences, and failing that to comma parts
+    fallback = sentences
+    if lines + len(sentences) < 2:
+        fallback = sentences + [p.strip() for p in text[:end].split(",") if len(p.strip()) > 20]
+    for item in fallback:
         if item not in seen:
             seen.add(item)
-            unique.append(item)
-
-    return unique
-
-
-def make_wrong_options(correct: str, pool: list, name: str) -> list:
-    """Generate 3 plausible but wrong options."""
-    fillers = [
-        f"Nothing significant for students",
-        f"Focused only on personal gains",
-        f"Had no clear plan for students",
-        f"Avoided student issues entirely",
-        f"Made promises without action",
-        f"Left office without any impact",
-        f"Only attended events for show",
-        f"Had no student welfare agenda",
-    ]
-    wrongs = [p for p in pool if p != correct]
-    random.shuffle(wrongs)
-    wrongs = wrongs[:2]
-    while len(wrongs) < 3:
-        f = random.choice(fillers)
-        if f not in wrongs:
-            wrongs.append(f)
-    return wrongs[:3]
-
-
-def build_questions(name: str, position: str, items: list, level: int) -> list:
-    """Build 5 questions from bullet points using psychological templates."""
-
-    if level == 1:
-        templates = [
-            ("What did {name} achieve for students?", "{item}"),
-            ("Which of the following did {name} accomplish?", "{item}"),
-            ("What has {name} done to prove their commitment to students?", "{item}"),
-            ("{name} is known for which of the following achievements?", "{item}"),
-            ("What makes {name} a credible candidate for {position}?", "{item}"),
-        ]
-        explanations = [
+            yield item
+            if len(seen) >= max_items:
+                return
+
+
+def parse_bullets(text: str, max_chars: int | None = None, max_items: int | None = None) -> list:
+    """Extract meaningful points from any text format — bullets, sentences, paragraphs."""
+    return list(iter_bullets(text, max_chars, max_items))
+
+
+FILLER_OPTIONS = (
+    "Nothing significant for students",
+    "Focused only on personal gains",
+    "Had no clear plan for students",
+    "Avoided student issues entirely",
+    "Made promises without action",
+    "Left office without any impact",
+    "Only attended events for show",
+    "Had no student welfare agenda",
+)
+
+
+def make_wrong_options(answers: tuple, correct_index: int, rng=random, similar: tuple = ()) -> list:
+    """Generate 3 plausible but wrong options.
+
+    With a `similar` shortlist (see rank_distractors) the options come from it.
+    Otherwise up to two other answers are drawn by index (no copy or shuffle of
+    the pool, so the cost does not grow with it). Fillers top the list up to three.
+    """
+    if similar:
+        wrongs = rng.sample(similar, min(3, len(similar)))
+    else:
+        picks = rng.sample(range(len(answers) - 1), min(2, len(answers) - 1))
+        wrongs = [answers[j + (j >= correct_index)] for j in picks]  # skip over the correct answer
+    return wrongs + rng.sample(FILLER_OPTIONS, 3 - len(wrongs))
+
+
+WORD = re.compile(r"[a-z0-9']+")
+# How many of the most similar answers each question's wrong options are drawn from
+DISTRACTOR_SHORTLIST = 6
+
+
+def rank_distractors(levels: dict) -> dict:
+    """For each answer, the most similar answers from the *other* levels by TF-IDF cosine.
+
+    Same-level answers are never used: another achievement is not a wrong answer to
+    "what did they achieve?". The matrix is built over unique texts, so a sentence
+    found in two other levels fills one slot of a shortlist, not two, and a text
+    that also appears in the question's own level is excluded with it. One matrix
+    product scores every pair at once.
+    Returns {level: (shortlist for answer 0, shortlist for answer 1, ...)}.
+    """
+    entries = [(level, text) for level, compiled in levels.items() if compiled for text in compiled.answers]
+    texts = list(dict.fromkeys(text for _, text in entries))
+    if np is None or len(texts) < 2:
+        return {}
+
+    vocab, rows, cols = {}, [], []
+    for row, text in enumerate(texts):
+        for term in WORD.findall(text.lower()):
+            rows.append(row)
+            cols.append(vocab.setdefault(term, len(vocab)))
+    tf = np.zeros((len(texts), max(len(vocab), 1)), dtype=np.float32)
+    np.add.at(tf, (rows, cols), 1)
+    idf = np.log((1 + len(texts)) / (1 + np.count_nonzero(tf, axis=0))) + 1
+    tfidf = tf * idf
+    tfidf /= np.maximum(np.linalg.norm(tfidf, axis=1, keepdims=True), 1e-12)
+
+    text_index = {text: i for i, text in enumerate(texts)}
+    in_level = {level: np.zeros(len(texts), dtype=bool) for level, _ in entries}
+    for level, text in entries:
+        in_level[level][text_index[text]] = True
+    similarity = (tfidf @ tfidf.T)[[text_index[text] for _, text in entries]]
+    similarity[np.array([in_level[level] for level, _ in entries])] = -np.inf
+    shortlist = min(DISTRACTOR_SHORTLIST, len(texts))
+    ranked = np.argsort(-similarity, axis=1, kind="stable")[:, :shortlist]
+
+    result = {level: [] for level in levels}
+    for row, (level, _) in enumerate(entries):
+        result[level].append(tuple(
+            texts[j] for j in ranked[row] if similarity[row, j] != -np.inf
+        ))
+    return {level: tuple(lists) for level, lists in result.items()}
+
+
+LEVEL_TEMPLATES = {
+    1: (
+        [
+            "What did {name} achieve for students?",
+            "Which of the following did {name} accomplish?",
+            "What has {name} done to prove their commitment to students?",
+            "{name} is known for which of the following achievements?",
+            "What makes {name} a credible candidate for {position}?",
+        ],
+        [
             "{name} has a real track record — this is exactly why students trust them.",
             "This achievement shows {name} doesn't just talk — they deliver.",
             "A leader who has already done this will do even more when elected.",
             "This is the kind of action that sets {name} apart from other candidates.",
             "Real results speak louder than promises — {name} has proven this.",
-        ]
-    elif level == 2:
-        templates = [
-            ("What is {name}'s plan for students if elected?", "{item}"),
-            ("Which of these is part of {name}'s manifesto?", "{item}"),
-            ("What does {name} promise to do for the student community?", "{item}"),
-            ("Which initiative is {name} committed to delivering?", "{item}"),
-            ("What vision does {name} have for {position}?", "{item}"),
-        ]
-        explanations = [
+        ],
+    ),
+    2: (
+        [
+            "What is {name}'s plan for students if elected?",
+            "Which of these is part of {name}'s manifesto?",
+            "What does {name} promise to do for the student community?",
+            "Which initiative is {name} committed to delivering?",
+            "What vision does {name} have for {position}?",
+        ],
+        [
             "This is {name}'s vision — a future built around student needs.",
             "{name} has thought this through — this plan directly benefits you.",
             "This promise shows {name} understands what students actually need.",
             "A leader with this vision is one worth voting for.",
             "This is exactly the kind of bold thinking students deserve in a leader.",
-        ]
-    else:
-        templates = [
-            ("What do you know about {name} as a person?", "{item}"),
-            ("Which of these describes {name} outside of their campaign?", "{item}"),
-            ("What makes {name} relatable to fellow students?", "{item}"),
-            ("Which fun fact about {name} is true?", "{item}"),
-            ("What do {name}'s closest friends say about them?", "{item}"),
-        ]
-        explanations = [
+        ],
+    ),
+    3: (
+        [
+            "What do you know about {name} as a person?",
+            "Which of these describes {name} outside of their campaign?",
+            "What makes {name} relatable to fellow students?",
+            "Which fun fact about {name} is true?",
+            "What do {name}'s closest friends say about them?",
+        ],
+        [
             "Getting to know {name} personally shows they're one of us — a real student.",
             "This is what makes {name} human, not just a candidate.",
             "A leader you can relate to is a leader you can trust.",
             "Knowing {name} beyond the campaign makes your vote more meaningful.",
             "This side of {name} shows the genuine person behind the campaign.",
-        ]
+        ],
+    ),
+}
 
-    questions = []
-    used = []
-    pool = [i for i in items if len(i) > 15]
 
+@dataclass(frozen=True)
+class CompiledLevel:
+    """Everything build_questions needs for one level, formatted and trimmed up front."""
+    stems: tuple         # question templates with name/position filled in
+    explanations: tuple  # explanations with name filled in
+    answers: tuple       # pool items trimmed to 120 chars, unique
+    distractors: tuple = ()  # per answer, a similarity-ranked shortlist of wrong options
+
+
+def compile_level(name: str, position: str, items: list, level: int) -> CompiledLevel | None:
+    pool = [i for i in items if len(i) > 15]
     if len(pool) < 2:
-        return get_fallback_questions(name, level)
+        return None
+    templates, explanations = LEVEL_TEMPLATES.get(level, LEVEL_TEMPLATES[3])
+    return CompiledLevel(
+        stems=tuple(t.format(name=name, position=position) for t in templates),
+        explanations=tuple(e.format(name=name) for e in explanations),
+        answers=tuple(dict.fromkeys(p[:120] for p in pool)),  # Trim long answers, then dedupe
+    )
 
-    # Repeat pool items if fewer than 5 so we always get 5 questions
-    extended_pool = (pool * 5)[:5]
-    for i, item in enumerate(extended_pool):
-        tmpl, _ = random.choice(templates)
-        expl = random.choice(explanations)
 
-        question_text = tmpl.format(name=name, position=position)
-        correct = item[:120]  # Trim long answers
-        wrongs = make_wrong_options(correct, [p[:120] for p in pool], name)
+def assemble_questions(compiled: CompiledLevel, rng=random, indices: list | None = None) -> list:
+    """Pick stems, distractors and option order — no parsing or formatting happens here.
+
+    indices chooses which answers to ask about; by default the first five.
+    """
+    questions = []
+    answers = compiled.answers
+    # Cycle through the pool if it has fewer than 5 items so we always get 5 questions
+    if indices is None:
+        indices = [i % len(answers) for i in range(5)]
+    for index in indices:
+        correct = answers[index]
+        question_text = rng.choice(compiled.stems)
+        expl = rng.choice(compiled.explanations)
+        similar = compiled.distractors[index] if compiled.distractors else ()
+        wrongs = make_wrong_options(answers, index, rng, similar)
 
         all_opts = [correct] + wrongs
-        random.shuffle(all_opts)
+        rng.shuffle(all_opts)
         answer_letter = ["A", "B", "C", "D"][all_opts.index(correct)]
 
         questions.append({
             "question": question_text,
             "options": all_opts,
             "answer": answer_letter,
-            "explanation": expl.format(name=name)
+            "explanation": expl
         })
 
-    return questions if questions else get_fallback_questions(name, level)
+    return questions
 
 
-def generate_campaign_questions(leader: LeaderProfile, level: int) -> list:
-    fields = {1: leader.achievements, 2: leader.manifesto, 3: leader.personality}
-    content = fields.get(level, "")
+def build_questions(name: str, position: str, items: list, level: int, rng=random) -> list:
+    """Build 5 questions from bullet points using psychological templates.
 
-    if not content or not content.strip():
-        return get_fallback_questions(leader.name, level)
+    Pass a seeded random.Random as rng to make the output reproducible.
+    """
+    compiled = compile_level(name, position, items, level)
+    if compiled is None:
+        return get_fallback_questions(name, level)
+    return assemble_questions(compiled, rng)
+
+
+def compile_campaign(leader: LeaderSnapshot) -> dict:
+    """Parse and format every level once per profile version; None marks a level with too little content."""
+    def compile_one(level, content):
+        if not content or not content.strip():
+            return None
+        items = parse_bullets(content)
+        if len(items) < 2:
+            return None
+        return compile_level(leader.name or "the candidate", leader.position or "Student Leader", items, level)
+
+    def compile_all():
+        levels = {
+            1: compile_one(1, leader.achievements),
+            2: compile_one(2, leader.manifesto),
+            3: compile_one(3, leader.personality),
+        }
+        ranked = rank_distractors(levels)
+        return {
+            level: replace(compiled, distractors=ranked[level]) if compiled and level in ranked else compiled
+            for level, compiled in levels.items()
+        }
+
+    return cached(leader, "compiled_levels", compile_all)
 
-    items = parse_bullets(content)
-    if len(items) < 2:
-        return get_fallback_questions(leader.name, level)
 
-    return build_questions(leader.name or "the candidate", leader.position or "Student Leader", items, level)
+def generate_campaign_questions(leader: LeaderSnapshot, level: int, rng=random) -> list:
+    compiled = compile_campaign(leader).get(level)
+    if compiled is None:
+        return get_fallback_questions(leader.name, level)
+    return assemble_questions(compiled, rng)
 
 
 def get_fallback_questions(name: str, level: int) -> list:
@@ -265,29 +981,798 @@ def get_fallback_questions(name: str, level: int) -> list:
     ] * 5
 
 
+# ─── QUESTION BANK ────────────────────────────────────────────────────────────
+def variant_rng(leader: LeaderSnapshot, level: int, variant: int) -> random.Random:
+    """Seed for one question set; the same profile version always yields the same set."""
+    return random.Random(f"{leader.version}:{level}:{variant}")
+
+
+def bank_picks(leader: LeaderSnapshot, level: int, compiled: CompiledLevel) -> list:
+    """Answer indices for each variant: consecutive take_unseen steps over one seeded order.
+
+    The order is served round and round, variant v from position v * QUESTIONS_PER_SET
+    on, so variants v, v+1, v+2, ... do not repeat an item until the level's pool
+    has been used up. Past the last variant the order does not go on at variant 0
+    unless the bank happens to end on a round; variant_walks takes care of that.
+    """
+    size = len(compiled.answers)
+    order = random.Random(f"{leader.version}:{level}").sample(range(size), size)
+    picks, seen = [], 0
+    for _ in range(QUESTION_BANK_SIZE):
+        chosen, seen = take_unseen(order, 0, seen)
+        picks.append(chosen)
+    return picks
+
+
+def build_question_bank(leader: LeaderSnapshot) -> dict:
+    bank = {}
+    for level in (1, 2, 3):
+        compiled = compile_campaign(leader).get(level)
+        if compiled is None:
+            bank[level] = [get_fallback_questions(leader.name, level)] * QUESTION_BANK_SIZE
+            continue
+        bank[level] = [
+            assemble_questions(compiled, variant_rng(leader, level, variant), picks)
+            for variant, picks in enumerate(bank_picks(leader, level, compiled))
+        ]
+    return bank
+
+
+def load_question_bank(db: Session, leader: LeaderSnapshot) -> dict:
+    """Read this version's bank from the DB, generating and storing it if no worker has yet.
+
+    Generation is seeded per variant and the stored copy always wins, so every
+    worker serves the same sets. Returns {level: [PreparedPage, ...]} indexed by variant.
+    """
+    payload = db.query(QuestionBank.payload).filter(QuestionBank.version == leader.version).scalar()
+    if payload is None:
+        db.execute(
+            pg_insert(QuestionBank)
+            .values(version=leader.version, campaign_id=leader.id, payload=json.dumps(build_question_bank(leader)))
+            .on_conflict_do_nothing(index_elements=[QuestionBank.version])
+        )
+        db.commit()
+        payload = db.query(QuestionBank.payload).filter(QuestionBank.version == leader.version).scalar()
+    return {
+        int(level): [
+            PreparedPage(json.dumps(questions, separators=(",", ":")), media_type="application/json")
+            for questions in sets
+        ]
+        for level, sets in json.loads(payload).items()
+    }
+
+
+def get_question_bank(db: Session, leader: LeaderSnapshot) -> dict:
+    return cached(leader, "question_bank", lambda: load_question_bank(db, leader))
+
+
+def all_levels_page(bank: dict, variant: int) -> PreparedPage:
+    """One payload {"1": [...], "2": [...], "3": [...]} spliced from the stored per-level sets."""
+    parts = [b'"%d":%s' % (level, sets[variant % len(sets)].body) for level, sets in sorted(bank.items())]
+    return PreparedPage("{%s}" % b",".join(parts).decode(), media_type="application/json")
+
+
+# ─── PER-USER SEQUENCING ──────────────────────────────────────────────────────
+QUESTIONS_PER_SET = 5  # items in each bank variant
+
+
+def take_unseen(order: list, offset: int, seen: int, count: int = QUESTIONS_PER_SET) -> tuple[list, int]:
+    """The next `count` items of `order` whose bits (offset + index) are clear in `seen`.
+
+    Returns the picks and `seen` with their bits set. Once every item has been
+    served the level's bits are cleared and the walk starts over, still without
+    repeating an item within the set; a pool smaller than `count` is cycled.
+    """
+    picks = []
+    for _ in range(2):
+        for index in order:
+            bit = 1 << (offset + index)
+            if not seen & bit and index not in picks:
+                picks.append(index)
+                seen |= bit
+                if len(picks) == count:
+                    return picks, seen
+        # Every item has been served: the next round starts with this set's remaining picks
+        seen &= ~(((1 << len(order)) - 1) << offset)
+    return [picks[i % len(picks)] for i in range(count)], seen
+
+
+def walk_variants(size: int, start: int, budget: int = 2_000) -> list:
+    """Every variant of a level with `size` pool items, in the order a user starting at `start` plays them.
+
+    Variant v's items start at position v * QUESTIONS_PER_SET of the level's cyclic
+    order (see bank_picks). After each variant comes the unplayed one that starts
+    nearest at or after where it ended, preferring the variant that follows it, so
+    the walk moves forward round the order and no item comes twice until the pool
+    has been used up. Where the bank does not end on a round boundary that means
+    carrying on at a later variant instead of wrapping to variant 0. Past that
+    first round the choice backtracks (within `budget` steps) where it would
+    otherwise strand variants that can only be reached by a jump putting two
+    overlapping sets in a row.
+    """
+    if size <= QUESTIONS_PER_SET:  # every set holds the whole pool
+        return [(start + step) % QUESTION_BANK_SIZE for step in range(QUESTION_BANK_SIZE)]
+    walk, left = [start], set(range(QUESTION_BANK_SIZE)) - {start}
+
+    def candidates(limit):
+        last = walk[-1]
+        end = (last + 1) * QUESTIONS_PER_SET % size
+        skips = sorted(((v * QUESTIONS_PER_SET - end) % size, (v - last) % QUESTION_BANK_SIZE, v) for v in left)
+        return [v for skip, _, v in skips if skip <= limit]
+
+    dead_ends = set()  # (last start, starts left) from which no walk goes on; same start, same items
+
+    def extend(limit) -> bool:
+        nonlocal budget
+        if not left:
+            return True
+        state = (walk[-1] * QUESTIONS_PER_SET % size, tuple(sorted(v * QUESTIONS_PER_SET % size for v in left)))
+        if state in dead_ends:
+            return False
+        for v in candidates(limit):
+            budget -= 1
+            if budget < 0:
+                return False
+            walk.append(v)
+            left.remove(v)
+            if extend(limit):
+                return True
+            walk.pop()
+            left.add(v)
+        dead_ends.add(state)
+        return False
+
+    def step():
+        following = candidates(size)[0]
+        walk.append(following)
+        left.remove(following)
+
+    while len(walk) < min(size // QUESTIONS_PER_SET, QUESTION_BANK_SIZE):  # the first round
+        step()
+    first_round = len(walk)
+    # Two sets in a row are apart while the skip between them leaves room for both
+    limit = size - 2 * QUESTIONS_PER_SET
+    if limit >= 0 and extend(limit):
+        return walk
+    left.update(walk[first_round:])
+    del walk[first_round:]
+    while left:  # not possible: the plain nearest-next walk
+        step()
+    return walk
+
+
+def variant_walk(leader: LeaderSnapshot, level: int, start: int) -> list:
+    """walk_variants for one level of this profile version, built on first use."""
+    walks = cached(leader, "variant_walks", dict)
+    walk = walks.get((level, start))
+    if walk is None:
+        compiled = compile_campaign(leader).get(level)
+        walk = walks.setdefault((level, start), walk_variants(len(compiled.answers) if compiled else 0, start))
+    return walk
+
+
+def next_variants(leader: LeaderSnapshot, user_id: str, seen_questions: bytes | None = None,
+                  seen_version: str | None = None) -> dict:
+    """Per level, the bank variants this user should play next, in order.
+
+    The bitset has QUESTION_BANK_SIZE bits per level (level 1's first) and resets
+    when the profile version changes. A user follows the walk (walk_variants)
+    from a start seeded by their id; the list begins at the first variant they
+    have not started and wraps round the walk, so retries do not repeat questions
+    until the pool is used up. A user who has started every variant starts over
+    at their first. The bits come with the user row, so choosing costs no query
+    of its own.
+    """
+    seen = int.from_bytes(seen_questions or b"", "little") if seen_version == leader.version else 0
+    start = random.Random(f"{leader.version}:{user_id}").randrange(QUESTION_BANK_SIZE)
+    variants = {}
+    for level in (1, 2, 3):
+        offset = (level - 1) * QUESTION_BANK_SIZE
+        walk = variant_walk(leader, level, start)
+        at = next((i for i, variant in enumerate(walk) if not seen >> (offset + variant) & 1), 0)
+        variants[level] = walk[at:] + walk[:at]
+    return variants
+
+
+SEEN_BYTES = (3 * QUESTION_BANK_SIZE + 7) // 8  # length of users.seen_questions
+
+
+def mark_variant_seen(db: Session, leader: LeaderSnapshot, user_id: uuid.UUID, level: int, variant: int) -> bool:
+    """Set the user's bit for a started variant in one UPDATE; False if there is no such user.
+
+    The bit is set with set_byte/get_byte in SQL, so two levels started at once
+    cannot overwrite each other's bit.
+    """
+    bit = (level - 1) * QUESTION_BANK_SIZE + variant
+    current = case(
+        (and_(User.seen_version == leader.version, func.length(User.seen_questions) == SEEN_BYTES),
+         User.seen_questions),
+        else_=bytes(SEEN_BYTES),
+    )
+    result = db.execute(
+        update(User)
+        .where(User.id == user_id, User.campaign_id == leader.id)
+        .values(
+            seen_questions=func.set_byte(current, bit // 8, func.get_byte(current, bit // 8).op("|")(1 << bit % 8)),
+            seen_version=leader.version,
+        )
+    )
+    return result.rowcount > 0
+
+
+def mark_buffered_variant_seen(leader: LeaderSnapshot, user_id: str, level: int, variant: int) -> bool:
+    """mark_variant_seen for a user still in the registration buffer; False if they are not."""
+    def set_bit(row):
+        seen = 0
+        if row.get("seen_questions") and row.get("seen_version") == leader.version:
+            seen = int.from_bytes(bytes.fromhex(row["seen_questions"]), "little")
+        seen |= 1 << (level - 1) * QUESTION_BANK_SIZE + variant
+        row["seen_questions"], row["seen_version"] = seen.to_bytes(SEEN_BYTES, "little").hex(), leader.version
+
+    row = registrations.get(user_id)
+    return row is not None and row["campaign_id"] == leader.id and registrations.amend(user_id, set_bit) is not None
+
+
+# ─── REGISTRATION BUFFER ──────────────────────────────────────────────────────
+WRITE_BATCH_ROWS = 1000  # rows per batched statement, well under Postgres' bind parameter limit
+
+
+class JournalSegment:
+    """One journal file, flock()ed by the process appending to or adopting it."""
+
+    def __init__(self, file):
+        self.file = file
+        self.written = 0  # lines handed to the OS
+        self.synced = 0   # lines known to be on disk
+
+    @classmethod
+    def create(cls, journal_path: str) -> "JournalSegment":
+        """A new segment, locked before it is used.
+
+        A starting worker's recover() may lock a file between its creation and our
+        flock; that name is left to it (it holds no rows) and another one is tried.
+        """
+        while True:
+            file = open(f"{journal_path}.{os.getpid()}.{time.time_ns()}", "a", encoding="utf-8")
+            try:
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                file.close()
+                continue
+            directory = os.open(os.path.dirname(os.path.abspath(file.name)), os.O_RDONLY)
+            try:
+                os.fsync(directory)  # so the new file itself survives a crash
+            finally:
+                os.close(directory)
+            return cls(file)
+
+
+class RegistrationBuffer:
+    """Registrations accepted in memory and written to Postgres in batches.
+
+    Every row is appended to a journal segment and fsync()ed before it is
+    acknowledged; concurrent registrations share one fsync (group commit). A
+    flush swaps the buffer out, writes it in one transaction and only then
+    deletes the segments it covered. Segments are flock()ed by their owner, so
+    on start-up a worker adopts only those left behind by a process that died.
+
+    Until its flush, a user exists only here: requests about them read the
+    buffered row, and a score or started question variant is amended into it
+    (and journaled again) rather than forcing an early flush.
+
+    A number is buffered once: a second registration gets the waiting row back.
+    Another worker may still buffer the same number; whichever row is written
+    second is folded into the stored user by write_registrations, and its id is
+    kept in `merged` so later requests that carry it reach the stored user.
+    """
+
+    def __init__(self, journal_path: str, max_rows: int):
+        self.journal_path = journal_path
+        self.max_rows = max_rows
+        self.lock = threading.Lock()        # guards the fields below
+        self.flush_lock = threading.Lock()  # one flush at a time
+        self.sync_lock = threading.Lock()   # one fsync at a time; held while segments are closed
+        self.rows: dict[str, dict] = {}     # id -> row waiting for the next flush, oldest first
+        self.flushing: dict[str, dict] = {}  # id -> row the running flush is writing
+        self.segments: list[JournalSegment] = []  # segments covering self.rows, oldest first
+        self.journal: JournalSegment | None = None  # the segment new rows are appended to
+        self.phones: dict[tuple, dict] = {}  # (campaign_id, phone_e164) -> row, waiting or flushing
+        self.tickets: dict[str, tuple] = {}  # id -> (segment, ticket) of the row's latest journal line
+        self.merged: dict[str, str] = {}     # id of a row folded into a stored user -> that user's id
+
+    def _append(self, row: dict) -> tuple[JournalSegment, int]:
+        """Write row to the current segment (under self.lock); sync() the returned ticket."""
+        if self.journal is None:
+            self.journal = JournalSegment.create(self.journal_path)
+            self.segments.append(self.journal)
+        segment = self.journal
+        segment.file.write(json.dumps(row) + "\n")
+        segment.file.flush()
+        segment.written += 1
+        self.tickets[row["id"]] = segment, segment.written
+        return segment, segment.written
+
+    def add(self, row: dict) -> dict | None:
+        """Journal and buffer a users row; None when the buffer is full.
+
+        Returns the row buffered for its number: `row` itself, or the one already
+        waiting for it, in which case nothing is written.
+        """
+        with self.lock:
+            existing = self.phones.get((row["campaign_id"], row.get("phone_e164")))
+            if existing is not None:
+                row = existing
+                segment, ticket = self.tickets.get(row["id"], (None, 0))  # none: recovered from disk
+            elif len(self.rows) >= self.max_rows:
+                return None
+            else:
+                segment, ticket = self._append(row)
+                self.rows[row["id"]] = row
+                self.phones[row["campaign_id"], row.get("phone_e164")] = row
+        if segment is not None:
+            self.sync(segment, ticket)
+        return row
+
+    def amend(self, user_id: str, change) -> dict | None:
+        """Apply change(row) to a buffered row and journal the result; None if it is not buffered.
+
+        A row that the running flush is writing cannot change any more: this waits
+        for that flush instead, so the caller then finds the user in the database
+        (or, if the flush failed, amends the row it put back).
+        """
+        while True:
+            with self.lock:
+                row = self.rows.get(user_id)
+                if row is not None:
+                    change(row)
+                    segment, ticket = self._append(row)
+                flushing = user_id in self.flushing
+            if row is not None:
+                self.sync(segment, ticket)
+                return row
+            if not flushing:
+                return None
+            with self.flush_lock:
+                pass
+
+    def sync(self, segment: JournalSegment, ticket: int):
+        """Return once the segment's first `ticket` lines are on disk.
+
+        Whoever holds sync_lock fsyncs every line written so far, so callers that
+        queued behind it usually find their line already covered.
+        """
+        with self.sync_lock:
+            if segment.synced >= ticket or segment.file.closed:
+                return  # on disk already, or written to Postgres by a flush since
+            written = segment.written
+            os.fsync(segment.file.fileno())
+            segment.synced = written
+
+    def get(self, user_id: str) -> dict | None:
+        """The buffered row for a user not yet in the database (or being written now)."""
+        with self.lock:
+            return self.rows.get(user_id) or self.flushing.get(user_id)
+
+    def find(self, campaign_id: int, phone_e164: str) -> dict | None:
+        return self.phones.get((campaign_id, phone_e164))
+
+    def resolve(self, user_id: str) -> str:
+        """The stored user's id for the id of a row that was folded into it."""
+        return self.merged.get(user_id, user_id)
+
+    def flush(self) -> int:
+        with self.flush_lock:
+            with self.lock:
+                rows, segments = self.rows, self.segments
+                self.flushing, self.rows, self.segments, self.journal = rows, {}, [], None
+            merged = {}
+            if rows:
+                try:
+                    merged = write_registrations(list(rows.values()))
+                except Exception:
+                    with self.lock:  # keep them, and their journal, for the next attempt
+                        self.rows, self.segments = {**rows, **self.rows}, segments + self.segments
+                        self.flushing = {}
+                    raise
+            with self.sync_lock:
+                for segment in segments:
+                    os.remove(segment.file.name)
+                    segment.file.close()
+            with self.lock:
+                self.flushing = {}
+                self.merged.update(merged)
+                for row in rows.values():
+                    self.tickets.pop(row["id"], None)
+                    if self.phones.get((row["campaign_id"], row.get("phone_e164"))) is row:
+                        del self.phones[row["campaign_id"], row.get("phone_e164")]
+            return len(rows)
+
+    def recover(self):
+        """Adopt journal segments whose writer is gone; the next flush writes them."""
+        directory, prefix = os.path.split(os.path.abspath(self.journal_path))
+        for name in sorted(os.listdir(directory)):
+            if not name.startswith(prefix + "."):
+                continue
+            journal = open(os.path.join(directory, name), "r+", encoding="utf-8")
+            try:
+                fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                journal.close()  # a live worker's segment
+                continue
+            rows = [json.loads(line) for line in journal if line.endswith("\n")]  # skip a torn last line
+            with self.lock:  # the file stays open, and locked, until a flush has written it
+                self.segments.append(JournalSegment(journal))
+                for row in rows:  # an amended row appears again further on; the last copy wins
+                    self.rows[row["id"]] = row
+                    self.phones[row["campaign_id"], row.get("phone_e164")] = row
+
+
+def write_registrations(rows: list) -> dict:
+    """Insert buffered users and credit their referrers, in one transaction.
+
+    Replaying a journal is safe: rows whose id is already present are skipped and
+    only newly inserted rows earn their referrer a retry. A row whose number was
+    stored meanwhile under another id (registered through another worker) is
+    folded into that user: the higher score and the union of started variants
+    are kept. Its referral code is dropped. Returns {row id: stored user id} for
+    the rows folded in.
+    """
+    db = SessionLocal()
+    try:
+        inserted = set()
+        for i in range(0, len(rows), WRITE_BATCH_ROWS):
+            batch = [
+                dict(row, id=uuid.UUID(row["id"]), created_at=datetime.fromisoformat(row["created_at"]),
+                     phone_e164=row.get("phone_e164"), score=row.get("score", 0),
+                     seen_questions=bytes.fromhex(row["seen_questions"]) if row.get("seen_questions") else None,
+                     seen_version=row.get("seen_version"))
+                for row in rows[i:i + WRITE_BATCH_ROWS]
+            ]
+            inserted.update(db.execute(
+                pg_insert(User).values(batch).on_conflict_do_nothing().returning(User.id)
+            ).scalars())
+        merged = {}
+        skipped = [row for row in rows if uuid.UUID(row["id"]) not in inserted and row.get("phone_e164")]
+        if skipped:
+            stored = {
+                (user.campaign_id, user.phone_e164): user for user in db.query(
+                    User.id, User.campaign_id, User.phone_e164, User.seen_questions, User.seen_version
+                ).filter(tuple_(User.campaign_id, User.phone_e164).in_(
+                    [(row["campaign_id"], row["phone_e164"]) for row in skipped]
+                ))
+            }
+            seen = {}  # stored id -> (bits, version) as merged so far
+            for row in skipped:
+                user = stored.get((row["campaign_id"], row["phone_e164"]))
+                if user is None or str(user.id) == row["id"]:
+                    continue  # replayed from the journal: this very row is stored already
+                merged[row["id"]] = str(user.id)
+                bits, version = seen.get(user.id, (user.seen_questions, user.seen_version))
+                if row.get("seen_questions") and (bits is None or version == row.get("seen_version")):
+                    extra = bytes.fromhex(row["seen_questions"])
+                    bits, version = bytes(a | b for a, b in zip(bits or bytes(len(extra)), extra)), row["seen_version"]
+                seen[user.id] = bits, version
+                db.execute(
+                    update(User).where(User.id == user.id)
+                    .values(score=func.greatest(User.score, row.get("score", 0)),
+                            seen_questions=bits, seen_version=version)
+                )
+        credits = Counter(
+            (row["campaign_id"], row["referred_by"])
+            for row in rows if row["referred_by"] and uuid.UUID(row["id"]) in inserted
+        )
+        if credits:
+            credit = values(
+                column("campaign_id", Integer), column("code", String), column("n", Integer), name="credit"
+            ).data([(campaign_id, code, n) for (campaign_id, code), n in credits.items()])
+            db.execute(
+                update(User)
+                .where(User.campaign_id == credit.c.campaign_id, User.referral_code == credit.c.code)
+                .values(retries_left=User.retries_left + credit.c.n)
+            )
+        db.commit()
+        return merged
+    finally:
+        db.close()
+
+
+registrations = RegistrationBuffer(REGISTER_JOURNAL, REGISTER_BUFFER_MAX)
+
+
+# ─── SCORES ───────────────────────────────────────────────────────────────────
+class BestScores:
+    """Last known best score per user id, least recently used dropped past max_users.
+
+    Scores only ever go up, so a value here may be behind the database but never
+    ahead of it, apart from scores still waiting in score_buffer: either way a
+    submission at or below it cannot change anything.
+    """
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self.lock = threading.Lock()
+        self.scores: OrderedDict[str, int] = OrderedDict()
+
+    def get(self, user_id: str) -> int | None:
+        with self.lock:
+            best = self.scores.get(user_id)
+            if best is not None:
+                self.scores.move_to_end(user_id)
+            return best
+
+    def put(self, user_id: str, best: int):
+        with self.lock:
+            if best >= self.scores.get(user_id, best):
+                self.scores[user_id] = best
+            self.scores.move_to_end(user_id)
+            if len(self.scores) > self.max_users:
+                self.scores.popitem(last=False)
+
+
+best_scores = BestScores(BEST_SCORE_CACHE_SIZE)
+
+
+class ScoreBuffer:
+    """Highest score submitted per user since the last flush, written in bulk.
+
+    The frontend submits a running total after every level, so within one
+    interval only each user's maximum matters.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.scores: dict[str, int] = {}
+
+    def add(self, user_id: str, score: int):
+        with self.lock:
+            if score > self.scores.get(user_id, score - 1):
+                self.scores[user_id] = score
+
+    def flush(self) -> int:
+        with self.lock:
+            scores, self.scores = self.scores, {}
+        if not scores:
+            return 0
+        try:
+            write_scores(scores)
+        except Exception:
+            for user_id, score in scores.items():  # retried with the next flush
+                self.add(user_id, score)
+            raise
+        return len(scores)
+
+
+def write_scores(scores: dict):
+    """UPDATE ... SET score = GREATEST(score, v.score) FROM (VALUES ...) v, in one transaction."""
+    items = list(scores.items())
+    rows = []
+    db = SessionLocal()
+    try:
+        for i in range(0, len(items), WRITE_BATCH_ROWS):
+            batch = values(
+                column("id", UUID(as_uuid=True)), column("score", Integer), name="batch"
+            ).data([(uuid.UUID(user_id), score) for user_id, score in items[i:i + WRITE_BATCH_ROWS]])
+            rows += db.execute(
+                update(User)
+                .where(User.id == batch.c.id)
+                .values(score=func.greatest(User.score, batch.c.score))
+                .returning(User.campaign_id, User.id, User.name, User.score, User.eligible_for_leaderboard)
+            ).all()
+        db.commit()
+    finally:
+        db.close()
+    for _, user_id, _, best, _ in rows:
+        best_scores.put(str(user_id), best)
+    offer_scores(rows)
+
+
+score_buffer = ScoreBuffer()
+
+LEADERBOARD_TOP = 10  # entries served by /leaderboard
+
+
+class Leaderboard:
+    """One campaign's top LEADERBOARD_KEEP eligible users, kept sorted as scores arrive.
+
+    Entries are (-score, -id, user_id, name), so the list's natural order is the
+    ranking: score, then id, both descending, as in ix_users_board. Scores only
+    rise and users only become eligible, so a score that cannot beat the last
+    entry of a full board can be ignored.
+
+    The /leaderboard body is serialized once and reused until an offer reaches
+    the top LEADERBOARD_TOP; after LEADERBOARD_TTL_SECONDS the board is due to be
+    re-read (see leaderboard_body).
+    """
+
+    def __init__(self, rows, keep: int = LEADERBOARD_KEEP):
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.entries = sorted(board_entry(str(user_id), name, score or 0) for user_id, name, score in rows)
+        self.keys = {entry[2]: entry for entry in self.entries}
+        self.full = len(self.entries) >= keep  # False: every eligible user is on the board
+        self.body = None
+        self.expires = time.monotonic() + LEADERBOARD_TTL_SECONDS
+        self.refreshing = False
+
+    def offer(self, user_id: str, name: str, score: int):
+        entry = board_entry(user_id, name, score)
+        with self.lock:
+            old = self.keys.get(user_id)
+            if old is None and self.full and entry >= self.entries[-1]:
+                return  # cannot reach the board
+            if old is not None:
+                if entry >= old:
+                    return
+                del self.entries[bisect.bisect_left(self.entries, old)]
+            position = bisect.bisect_left(self.entries, entry)
+            self.entries.insert(position, entry)
+            self.keys[user_id] = entry
+            if position < LEADERBOARD_TOP:
+                self.body = None
+            if len(self.entries) > self.keep:
+                del self.keys[self.entries.pop()[2]]
+                self.full = True
+
+    def response(self) -> bytes:
+        with self.lock:
+            if self.body is None:
+                top = [{"rank": i + 1, "name": name, "score": -negative}
+                       for i, (negative, _, _, name) in enumerate(self.entries[:LEADERBOARD_TOP])]
+                self.body = json.dumps(top, ensure_ascii=False, separators=(",", ":")).encode()
+            return self.body
+
+    def claim_refresh(self) -> bool:
+        """True for the one caller that should re-read this board once it has expired."""
+        with self.lock:
+            if self.refreshing or time.monotonic() < self.expires:
+                return False
+            self.refreshing = True
+            return True
+
+
+def encode_cursor(score: int, user_id: uuid.UUID, rank: int) -> str:
+    """Opaque keyset cursor: the last row's (score, id) and its rank, for numbering the next page."""
+    return base64.urlsafe_b64encode(f"{score}:{user_id.hex}:{rank}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[int, uuid.UUID, int]:
+    try:
+        score, user_id, rank = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(":")
+        return int(score), uuid.UUID(user_id), int(rank)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def board_entry(user_id: str, name: str, score: int) -> tuple:
+    return (-score, -uuid.UUID(user_id).int, user_id, name)
+
+
+def on_board(campaign_id: int):
+    """Filter for the users a campaign's leaderboard ranks."""
+    return (User.campaign_id == campaign_id, User.eligible_for_leaderboard == True)  # noqa
+
+
+def load_leaderboard(db: Session, campaign_id: int) -> Leaderboard:
+    return Leaderboard(
+        db.query(User.id, User.name, User.score)
+        .filter(*on_board(campaign_id))
+        .order_by(User.score.desc(), User.id.desc())
+        .limit(LEADERBOARD_KEEP)
+        .all()
+    )
+
+
+board_loads = threading.Lock()
+
+
+def get_leaderboard(db: Session, campaign_id: int) -> Leaderboard:
+    """The campaign's board, read from the database only when it is not cached yet."""
+    get_leader(db, campaign_id)
+    entry = campaigns.peek(campaign_id)
+    board = entry.board if entry is not None else None
+    if board is None:
+        db.rollback()  # hand the connection back while waiting, or the loader may find the pool empty
+        with board_loads:  # requests racing a cold board wait for one load instead of each running it
+            entry = campaigns.peek(campaign_id)
+            board = entry.board if entry is not None else None
+            if board is None:
+                board = load_leaderboard(db, campaign_id)
+                if entry is not None:
+                    entry.board = board
+                    campaigns.charge(entry.snapshot, footprint(board.entries))
+    return board
+
+
+def leaderboard_body(db: Session, campaign_id: int) -> bytes:
+    """The serialized /leaderboard response.
+
+    Once the board is LEADERBOARD_TTL_SECONDS old, the first request re-reads it
+    so scores written by other workers show up; requests arriving meanwhile are
+    served the previous body rather than running the same query.
+    """
+    board = get_leaderboard(db, campaign_id)
+    if board.claim_refresh():
+        try:
+            fresh = load_leaderboard(db, campaign_id)
+        finally:
+            board.refreshing = False  # on failure the next request tries again
+        entry = campaigns.peek(campaign_id)
+        if entry is not None and entry.board is board:
+            entry.board = fresh
+        board = fresh
+    return board.response()
+
+
+def offer_scores(rows):
+    """Feed (campaign_id, user_id, name, score, eligible) rows to the cached boards."""
+    for campaign_id, user_id, name, score, eligible in rows:
+        entry = campaigns.peek(campaign_id)
+        if eligible and entry is not None and entry.board is not None:
+            entry.board.offer(str(user_id), name, score)
+
+
+def sync_leaderboards():
+    """Re-read cached boards so scores written by other workers appear."""
+    if not SessionLocal:
+        return
+    db = SessionLocal()
+    try:
+        with campaigns.lock:
+            cached_entries = list(campaigns.entries.items())
+        for campaign_id, entry in cached_entries:
+            if entry.board is not None:
+                entry.board = load_leaderboard(db, campaign_id)
+    finally:
+        db.close()
+
+
 # ─── SCHEDULER ────────────────────────────────────────────────────────────────
 def update_leaderboard_eligibility():
+    """Make users eligible two hours after sign-up, and put them on the cached boards."""
     if not SessionLocal:
         return
     db = SessionLocal()
     try:
-        users = db.query(User).filter(User.eligible_for_leaderboard == False).all()  # noqa
-        for user in users:
-            if user.created_at:
-                if datetime.now(timezone.utc) - user.created_at >= timedelta(hours=2):
-                    user.eligible_for_leaderboard = True
+        rows = db.execute(
+            update(User)
+            .where(User.eligible_for_leaderboard == False,  # noqa
+                   User.created_at <= datetime.now(timezone.utc) - timedelta(hours=2))
+            .values(eligible_for_leaderboard=True)
+            .returning(User.campaign_id, User.id, User.name, User.score, User.eligible_for_leaderboard)
+        ).all()
         db.commit()
     finally:
         db.close()
+    offer_scores(rows)
 
 
 scheduler = BackgroundScheduler()
 scheduler.add_job(update_leaderboard_eligibility, "interval", minutes=5)
+scheduler.add_job(sync_leaderboards, "interval", seconds=LEADERBOARD_SYNC_SECONDS)
+if SessionLocal:
+    backfill_phone_e164()
+if REGISTER_FLUSH_MS > 0 and SessionLocal:
+    registrations.recover()
+    scheduler.add_job(registrations.flush, "interval", seconds=REGISTER_FLUSH_MS / 1000)
+if SCORE_FLUSH_MS > 0 and SessionLocal:
+    scheduler.add_job(score_buffer.flush, "interval", seconds=SCORE_FLUSH_MS / 1000)
 scheduler.start()
 
+
 # ─── APP ──────────────────────────────────────────────────────────────────────
-app = FastAPI(title="QuizRush Campaign")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    scheduler.shutdown()
+    if SessionLocal:  # drain what the last interval had not written yet
+        registrations.flush()
+        score_buffer.flush()
+
+
+app = FastAPI(title="QuizRush Campaign", lifespan=lifespan)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
+# Per-campaign routes, mounted at / (campaign picked by Host) and under /c/{slug}/
+campaign_routes = APIRouter()
 
 
 # ─── SCHEMAS ──────────────────────────────────────────────────────────────────
@@ -299,6 +1784,7 @@ class UserCreate(BaseModel):
 
 class LeaderProfileUpdate(BaseModel):
     password: str
+    admin_password: str | None = None  # needed to create a campaign or change its domain; sets its password to `password`
     name: str
     position: str
     achievements: str
@@ -306,6 +1792,8 @@ class LeaderProfileUpdate(BaseModel):
     personality: str
     slogan: str
     campaign_color: str = "#e63946"
+    hostname: str | None = None   # empty keeps the current domain; a new one needs admin_password
+    clear_hostname: bool = False  # stop serving the campaign at its custom domain (admin_password too)
 
 
 # ─── LEADER SETUP PAGE ────────────────────────────────────────────────────────
@@ -351,9 +1839,12 @@ SETUP_HTML = """<!DOCTYPE html>
 
   <div class="card">
     <div class="form-group"><label>Setup Password</label><input type="password" id="password" placeholder="Enter campaign password" /></div>
+    <div class="form-group"><label>Admin Password (only to create this campaign, reset its password or change its domain)</label><input type="password" id="admin_password" placeholder="Leave empty for normal saves" /></div>
     <div class="form-group"><label>Your Full Name</label><input type="text" id="name" placeholder="e.g. Emmanuel Osei" /></div>
     <div class="form-group"><label>Position You're Running For</label><input type="text" id="position" placeholder="e.g. Student Union President, University of Ghana" /></div>
     <div class="form-group"><label>Campaign Slogan</label><input type="text" id="slogan" placeholder="e.g. Students First, Always." /></div>
+    <div class="form-group"><label>Custom Domain (optional, leave empty to keep the current one; changing it needs the admin password)</label><input type="text" id="hostname" placeholder="e.g. vote-ama.com" />
+      <label><input type="checkbox" id="clear_hostname" style="width:auto" /> Remove the custom domain</label></div>
     <div class="form-group">
       <label>Campaign Color</label>
       <div class="color-row">
@@ -411,13 +1902,14 @@ SETUP_HTML = """<!DOCTYPE html>
   </div>
 
   <button class="btn" onclick="saveProfile()">🚀 Save Campaign Profile & Generate Questions</button>
-  <div class="success" id="success-msg">✅ Profile saved! Students will now get AI-generated questions about you. Go check the quiz at <strong>/</strong></div>
+  <div class="success" id="success-msg">✅ Profile saved! Students will now get AI-generated questions about you. Go check the quiz at <strong id="quiz-path">/</strong></div>
 </div>
 
 <script>
 async function saveProfile() {
   const payload = {
     password: document.getElementById('password').value,
+    admin_password: document.getElementById('admin_password').value || null,
     name: document.getElementById('name').value,
     position: document.getElementById('position').value,
     slogan: document.getElementById('slogan').value,
@@ -425,6 +1917,8 @@ async function saveProfile() {
     achievements: document.getElementById('achievements').value,
     manifesto: document.getElementById('manifesto').value,
     personality: document.getElementById('personality').value,
+    hostname: document.getElementById('hostname').value.trim() || null,
+    clear_hostname: document.getElementById('clear_hostname').checked,
   };
 
   if (!payload.password || !payload.name || !payload.achievements) {
@@ -433,13 +1927,14 @@ async function saveProfile() {
   }
 
   try {
-    const res = await fetch('/setup', {
+    const res = await fetch(location.pathname, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify(payload)
     });
     const data = await res.json();
     if (res.ok) {
+      document.getElementById('quiz-path').textContent = location.pathname.replace(/setup$/, '');
       document.getElementById('success-msg').style.display = 'block';
       window.scrollTo({ top: 0, behavior: 'smooth' });
     } else {
@@ -453,60 +1948,45 @@ async function saveProfile() {
 </body>
 </html>"""
 
+SETUP_PAGE = PreparedPage(SETUP_HTML)
 
-# ─── STUDENT QUIZ FRONTEND ────────────────────────────────────────────────────
-def build_student_html(leader: LeaderProfile) -> str:
-    color = leader.campaign_color or "#e63946"
-    name = leader.name or "Our Candidate"
-    position = leader.position or "Student Leader"
-    slogan = leader.slogan or "The Right Choice."
 
-    return f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-<meta charset="UTF-8">
-<meta name="viewport" content="width=device-width, initial-scale=1.0">
-<title>Do You Really Know {name}?</title>
-<link href="https://fonts.googleapis.com/css2?family=Bebas+Neue&family=DM+Sans:wght@300;400;500;600&display=swap" rel="stylesheet">
-<style>
-  :root {{
+# ─── STUDENT QUIZ FRONTEND ────────────────────────────────────────────────────
+STUDENT_CSS = """  :root {
     --bg: #050508;
     --surface: #0d0d14;
     --card: #111118;
     --border: #1f1f2e;
-    --accent: {color};
-    --accent-dim: {color}22;
-    --accent-glow: {color}44;
     --text: #f5f5f7;
     --muted: #6b6b80;
     --gold: #ffd60a;
     --green: #06d6a0;
     --radius: 18px;
-  }}
+  }
 
-  * {{ margin:0; padding:0; box-sizing:border-box; }}
+  * { margin:0; padding:0; box-sizing:border-box; }
 
-  body {{
+  body {
     font-family: 'DM Sans', sans-serif;
     background: var(--bg);
     color: var(--text);
     min-height: 100vh;
     overflow-x: hidden;
-  }}
+  }
 
   /* Dramatic background */
-  body::before {{
+  body::before {
     content: '';
     position: fixed;
     inset: 0;
     background:
-      radial-gradient(ellipse 80% 50% at 50% -20%, {color}18 0%, transparent 60%),
-      radial-gradient(ellipse 40% 40% at 80% 80%, {color}08 0%, transparent 50%);
+      radial-gradient(ellipse 80% 50% at 50% -20%, var(--accent-18) 0%, transparent 60%),
+      radial-gradient(ellipse 40% 40% at 80% 80%, var(--accent-08) 0%, transparent 50%);
     pointer-events: none;
     z-index: 0;
-  }}
+  }
 
-  #app {{
+  #app {
     position: relative;
     z-index: 1;
     display: flex;
@@ -514,35 +1994,35 @@ def build_student_html(leader: LeaderProfile) -> str:
     align-items: center;
     min-height: 100vh;
     padding: 0 16px 80px;
-  }}
+  }
 
-  .screen {{ display:none; width:100%; max-width:540px; animation: fadeUp 0.5s ease forwards; }}
-  .screen.active {{ display:flex; flex-direction:column; gap:18px; padding-top:32px; }}
+  .screen { display:none; width:100%; max-width:540px; animation: fadeUp 0.5s ease forwards; }
+  .screen.active { display:flex; flex-direction:column; gap:18px; padding-top:32px; }
 
-  @keyframes fadeUp {{
-    from {{ opacity:0; transform:translateY(30px); }}
-    to {{ opacity:1; transform:translateY(0); }}
-  }}
+  @keyframes fadeUp {
+    from { opacity:0; transform:translateY(30px); }
+    to { opacity:1; transform:translateY(0); }
+  }
 
   /* ── HERO LANDING ── */
-  .campaign-hero {{
+  .campaign-hero {
     text-align: center;
     padding: 48px 24px 36px;
-    background: linear-gradient(180deg, {color}15 0%, transparent 100%);
-    border: 1px solid {color}30;
+    background: linear-gradient(180deg, var(--accent-15) 0%, transparent 100%);
+    border: 1px solid var(--accent-30);
     border-radius: var(--radius);
     position: relative;
     overflow: hidden;
-  }}
-  .campaign-hero::before {{
+  }
+  .campaign-hero::before {
     content: '';
     position: absolute;
     top: 0; left: 0; right: 0;
     height: 3px;
-    background: linear-gradient(90deg, transparent, {color}, transparent);
-  }}
+    background: linear-gradient(90deg, transparent, var(--accent), transparent);
+  }
 
-  .election-badge {{
+  .election-badge {
     display: inline-flex;
     align-items: center;
     gap: 6px;
@@ -556,53 +2036,53 @@ def build_student_html(leader: LeaderProfile) -> str:
     padding: 5px 14px;
     border-radius: 100px;
     margin-bottom: 20px;
-  }}
-  .pulse-dot {{
+  }
+  .pulse-dot {
     width: 6px; height: 6px;
     border-radius: 50%;
     background: var(--accent);
     animation: pulse 1.5s infinite;
-  }}
-  @keyframes pulse {{ 0%,100% {{ opacity:1;transform:scale(1); }} 50% {{ opacity:0.4;transform:scale(1.5); }} }}
+  }
+  @keyframes pulse { 0%,100% { opacity:1;transform:scale(1); } 50% { opacity:0.4;transform:scale(1.5); } }
 
-  .hero-name {{
+  .hero-name {
     font-family: 'Bebas Neue', sans-serif;
     font-size: 52px;
     letter-spacing: 3px;
     line-height: 1;
     margin-bottom: 8px;
-    background: linear-gradient(135deg, #fff 0%, {color} 100%);
+    background: linear-gradient(135deg, #fff 0%, var(--accent) 100%);
     -webkit-background-clip: text;
     -webkit-text-fill-color: transparent;
     background-clip: text;
-  }}
+  }
 
-  .hero-position {{
+  .hero-position {
     font-size: 13px;
     color: var(--muted);
     letter-spacing: 1px;
     text-transform: uppercase;
     margin-bottom: 16px;
-  }}
+  }
 
-  .hero-slogan {{
+  .hero-slogan {
     font-size: 22px;
     font-weight: 600;
     color: var(--text);
     margin-bottom: 24px;
     font-style: italic;
-  }}
+  }
 
-  .hero-question {{
+  .hero-question {
     font-size: 15px;
     color: var(--muted);
     line-height: 1.7;
-  }}
-  .hero-question strong {{ color: var(--text); }}
+  }
+  .hero-question strong { color: var(--text); }
 
   /* ── LEVEL SELECT ── */
-  .level-cards {{ display:flex; flex-direction:column; gap:12px; }}
-  .level-card {{
+  .level-cards { display:flex; flex-direction:column; gap:12px; }
+  .level-card {
     padding: 20px;
     border-radius: 14px;
     border: 1.5px solid var(--border);
@@ -614,34 +2094,34 @@ def build_student_html(leader: LeaderProfile) -> str:
     gap: 16px;
     position: relative;
     overflow: hidden;
-  }}
-  .level-card::before {{
+  }
+  .level-card::before {
     content: '';
     position: absolute;
     left: 0; top: 0; bottom: 0;
     width: 3px;
     background: var(--lc);
     border-radius: 3px 0 0 3px;
-  }}
-  .level-card:hover {{ transform: translateX(6px); border-color: var(--lc); }}
-  .level-icon {{ font-size: 28px; flex-shrink:0; }}
-  .level-info {{ flex:1; }}
-  .level-label {{
+  }
+  .level-card:hover { transform: translateX(6px); border-color: var(--lc); }
+  .level-icon { font-size: 28px; flex-shrink:0; }
+  .level-info { flex:1; }
+  .level-label {
     font-size: 10px;
     font-weight: 700;
     letter-spacing: 2px;
     text-transform: uppercase;
     color: var(--lc);
     margin-bottom: 3px;
-  }}
-  .level-title {{ font-weight: 600; font-size: 16px; margin-bottom: 2px; }}
-  .level-desc {{ font-size: 12px; color: var(--muted); }}
-  .level-arrow {{ color: var(--muted); font-size: 18px; }}
-  .level-locked {{ opacity: 0.35; cursor: not-allowed; }}
-  .level-locked:hover {{ transform: none; }}
+  }
+  .level-title { font-weight: 600; font-size: 16px; margin-bottom: 2px; }
+  .level-desc { font-size: 12px; color: var(--muted); }
+  .level-arrow { color: var(--muted); font-size: 18px; }
+  .level-locked { opacity: 0.35; cursor: not-allowed; }
+  .level-locked:hover { transform: none; }
 
   /* ── QUIZ SCREEN ── */
-  .quiz-header {{
+  .quiz-header {
     display: flex;
     align-items: center;
     justify-content: space-between;
@@ -649,55 +2129,55 @@ def build_student_html(leader: LeaderProfile) -> str:
     background: var(--card);
     border: 1px solid var(--border);
     border-radius: 14px;
-  }}
-  .quiz-level-tag {{
+  }
+  .quiz-level-tag {
     font-size: 10px;
     font-weight: 700;
     letter-spacing: 2px;
     text-transform: uppercase;
     color: var(--accent);
-  }}
-  .timer {{
+  }
+  .timer {
     font-family: 'Bebas Neue', sans-serif;
     font-size: 28px;
     letter-spacing: 2px;
     transition: color 0.3s;
-  }}
-  .timer.safe {{ color: var(--green); }}
-  .timer.warn {{ color: var(--gold); }}
-  .timer.danger {{ color: var(--accent); animation: shake 0.3s infinite; }}
-  @keyframes shake {{ 0%,100% {{ transform:translateX(0); }} 50% {{ transform:translateX(3px); }} }}
+  }
+  .timer.safe { color: var(--green); }
+  .timer.warn { color: var(--gold); }
+  .timer.danger { color: var(--accent); animation: shake 0.3s infinite; }
+  @keyframes shake { 0%,100% { transform:translateX(0); } 50% { transform:translateX(3px); } }
 
-  .progress-bar {{
+  .progress-bar {
     height: 3px;
     background: var(--border);
     border-radius: 2px;
     overflow: hidden;
-  }}
-  .progress-fill {{
+  }
+  .progress-fill {
     height: 100%;
     background: var(--accent);
     border-radius: 2px;
     transition: width 0.5s ease;
     box-shadow: 0 0 8px var(--accent-glow);
-  }}
+  }
 
-  .question-card {{
+  .question-card {
     background: var(--card);
     border: 1px solid var(--border);
     border-radius: var(--radius);
     padding: 28px;
-  }}
-  .q-num {{ font-size: 11px; color: var(--muted); margin-bottom: 10px; letter-spacing: 1px; }}
-  .q-text {{
+  }
+  .q-num { font-size: 11px; color: var(--muted); margin-bottom: 10px; letter-spacing: 1px; }
+  .q-text {
     font-size: 19px;
     font-weight: 600;
     line-height: 1.5;
     margin-bottom: 22px;
-  }}
+  }
 
-  .options {{ display:flex; flex-direction:column; gap:10px; }}
-  .option {{
+  .options { display:flex; flex-direction:column; gap:10px; }
+  .option {
     padding: 14px 18px;
     background: var(--surface);
     border: 1.5px solid var(--border);
@@ -709,8 +2189,8 @@ def build_student_html(leader: LeaderProfile) -> str:
     display: flex;
     align-items: flex-start;
     gap: 12px;
-  }}
-  .opt-letter {{
+  }
+  .opt-letter {
     width: 26px; height: 26px;
     border-radius: 7px;
     background: var(--border);
@@ -719,16 +2199,16 @@ def build_student_html(leader: LeaderProfile) -> str:
     flex-shrink: 0;
     transition: all 0.2s;
     margin-top: 1px;
-  }}
-  .option:hover:not(.locked) {{ border-color: var(--accent); background: var(--accent-dim); }}
-  .option:hover:not(.locked) .opt-letter {{ background: var(--accent); color: #fff; }}
-  .option.correct {{ border-color: var(--green); background: rgba(6,214,160,0.08); }}
-  .option.correct .opt-letter {{ background: var(--green); color: #000; }}
-  .option.wrong {{ border-color: var(--accent); background: rgba(230,57,70,0.08); }}
-  .option.wrong .opt-letter {{ background: var(--accent); color: #fff; }}
-  .option.locked {{ cursor: default; }}
-
-  .explanation {{
+  }
+  .option:hover:not(.locked) { border-color: var(--accent); background: var(--accent-dim); }
+  .option:hover:not(.locked) .opt-letter { background: var(--accent); color: #fff; }
+  .option.correct { border-color: var(--green); background: rgba(6,214,160,0.08); }
+  .option.correct .opt-letter { background: var(--green); color: #000; }
+  .option.wrong { border-color: var(--accent); background: rgba(230,57,70,0.08); }
+  .option.wrong .opt-letter { background: var(--accent); color: #fff; }
+  .option.locked { cursor: default; }
+
+  .explanation {
     margin-top: 14px;
     padding: 12px 16px;
     background: rgba(6,214,160,0.06);
@@ -738,19 +2218,19 @@ def build_student_html(leader: LeaderProfile) -> str:
     color: var(--green);
     line-height: 1.6;
     display: none;
-  }}
+  }
 
-  .score-pop {{
+  .score-pop {
     text-align: center;
     font-family: 'Bebas Neue', sans-serif;
     font-size: 22px;
     letter-spacing: 2px;
     min-height: 32px;
     color: var(--green);
-  }}
+  }
 
   /* ── RESULT ── */
-  .result-hero {{
+  .result-hero {
     text-align: center;
     padding: 40px 24px;
     background: var(--card);
@@ -758,25 +2238,25 @@ def build_student_html(leader: LeaderProfile) -> str:
     border-radius: var(--radius);
     position: relative;
     overflow: hidden;
-  }}
-  .result-hero::before {{
+  }
+  .result-hero::before {
     content: '';
     position: absolute;
     top: 0; left: 0; right: 0;
     height: 3px;
-    background: linear-gradient(90deg, transparent, {color}, transparent);
-  }}
-  .result-emoji {{ font-size: 56px; margin-bottom: 12px; }}
-  .result-score-big {{
+    background: linear-gradient(90deg, transparent, var(--accent), transparent);
+  }
+  .result-emoji { font-size: 56px; margin-bottom: 12px; }
+  .result-score-big {
     font-family: 'Bebas Neue', sans-serif;
     font-size: 72px;
     letter-spacing: 4px;
     color: var(--accent);
     line-height: 1;
-  }}
-  .result-label {{ font-size: 13px; color: var(--muted); margin-top: 4px; }}
-  .result-verdict {{ font-size: 22px; font-weight: 700; margin-top: 12px; }}
-  .result-cta {{
+  }
+  .result-label { font-size: 13px; color: var(--muted); margin-top: 4px; }
+  .result-verdict { font-size: 22px; font-weight: 700; margin-top: 12px; }
+  .result-cta {
     margin-top: 20px;
     padding: 16px 24px;
     background: var(--accent-dim);
@@ -786,37 +2266,37 @@ def build_student_html(leader: LeaderProfile) -> str:
     font-weight: 600;
     color: var(--accent);
     line-height: 1.5;
-  }}
+  }
 
-  .stat-strip {{
+  .stat-strip {
     display: grid;
     grid-template-columns: 1fr 1fr 1fr;
     gap: 10px;
-  }}
-  .stat-box {{
+  }
+  .stat-box {
     background: var(--card);
     border: 1px solid var(--border);
     border-radius: 12px;
     padding: 14px;
     text-align: center;
-  }}
-  .stat-val {{
+  }
+  .stat-val {
     font-family: 'Bebas Neue', sans-serif;
     font-size: 26px;
     letter-spacing: 1px;
     color: var(--accent);
-  }}
-  .stat-lbl {{ font-size: 11px; color: var(--muted); margin-top: 2px; }}
+  }
+  .stat-lbl { font-size: 11px; color: var(--muted); margin-top: 2px; }
 
-  .referral-section {{
+  .referral-section {
     background: var(--card);
     border: 1px solid var(--border);
     border-radius: var(--radius);
     padding: 24px;
-  }}
-  .ref-title {{ font-size: 16px; font-weight: 700; margin-bottom: 6px; }}
-  .ref-sub {{ font-size: 13px; color: var(--muted); margin-bottom: 14px; line-height: 1.6; }}
-  .ref-code {{
+  }
+  .ref-title { font-size: 16px; font-weight: 700; margin-bottom: 6px; }
+  .ref-sub { font-size: 13px; color: var(--muted); margin-bottom: 14px; line-height: 1.6; }
+  .ref-code {
     background: var(--surface);
     border: 1.5px dashed var(--accent);
     border-radius: 12px;
@@ -827,67 +2307,67 @@ def build_student_html(leader: LeaderProfile) -> str:
     letter-spacing: 6px;
     color: var(--accent);
     cursor: pointer;
-  }}
-  .ref-code:hover {{ background: var(--accent-dim); }}
+  }
+  .ref-code:hover { background: var(--accent-dim); }
 
   /* ── LEADERBOARD ── */
-  .lb-item {{
+  .lb-item {
     display: flex; align-items: center; gap: 14px;
     padding: 14px 16px;
     background: var(--card);
     border: 1px solid var(--border);
     border-radius: 12px;
     transition: transform 0.2s;
-  }}
-  .lb-item:hover {{ transform: translateX(4px); }}
-  .lb-item.gold {{ border-color: var(--gold); background: rgba(255,214,10,0.04); }}
-  .lb-item.silver {{ border-color: #aaa; }}
-  .lb-item.bronze {{ border-color: #cd7f32; }}
-  .lb-rank {{ font-family:'Bebas Neue',sans-serif; font-size:22px; width:30px; text-align:center; }}
-  .lb-name {{ flex:1; font-weight:500; }}
-  .lb-score {{ font-family:'Bebas Neue',sans-serif; font-size:20px; color:var(--accent); letter-spacing:1px; }}
+  }
+  .lb-item:hover { transform: translateX(4px); }
+  .lb-item.gold { border-color: var(--gold); background: rgba(255,214,10,0.04); }
+  .lb-item.silver { border-color: #aaa; }
+  .lb-item.bronze { border-color: #cd7f32; }
+  .lb-rank { font-family:'Bebas Neue',sans-serif; font-size:22px; width:30px; text-align:center; }
+  .lb-name { flex:1; font-weight:500; }
+  .lb-score { font-family:'Bebas Neue',sans-serif; font-size:20px; color:var(--accent); letter-spacing:1px; }
 
   /* ── BUTTONS ── */
-  .btn {{
+  .btn {
     padding: 16px 24px; border-radius: 13px;
     font-family: 'Bebas Neue', sans-serif;
     font-size: 17px; letter-spacing: 1.5px;
     cursor: pointer; border: none;
     transition: all 0.2s;
     display: flex; align-items: center; justify-content: center; gap: 8px;
-  }}
-  .btn-primary {{
+  }
+  .btn-primary {
     background: var(--accent);
     color: white;
     box-shadow: 0 4px 24px var(--accent-glow);
-  }}
-  .btn-primary:hover {{ transform:translateY(-2px); box-shadow: 0 8px 32px var(--accent-glow); }}
-  .btn-outline {{
+  }
+  .btn-primary:hover { transform:translateY(-2px); box-shadow: 0 8px 32px var(--accent-glow); }
+  .btn-outline {
     background: transparent;
     border: 1.5px solid var(--border);
     color: var(--muted);
     font-family: 'DM Sans', sans-serif;
     font-size: 14px;
     letter-spacing: 0;
-  }}
-  .btn-outline:hover {{ border-color: var(--accent); color: var(--accent); }}
-  .btn:disabled {{ opacity:0.4; cursor:not-allowed; transform:none !important; }}
+  }
+  .btn-outline:hover { border-color: var(--accent); color: var(--accent); }
+  .btn:disabled { opacity:0.4; cursor:not-allowed; transform:none !important; }
 
   /* ── REGISTER ── */
-  .reg-card {{ background:var(--card); border:1px solid var(--border); border-radius:var(--radius); padding:28px; }}
-  .reg-title {{ font-size:18px; font-weight:700; margin-bottom:4px; }}
-  .reg-sub {{ font-size:13px; color:var(--muted); margin-bottom:20px; }}
-  .form-group {{ display:flex; flex-direction:column; gap:7px; margin-bottom:14px; }}
-  label {{ font-size:12px; color:var(--muted); font-weight:600; letter-spacing:0.5px; text-transform:uppercase; }}
-  input {{
+  .reg-card { background:var(--card); border:1px solid var(--border); border-radius:var(--radius); padding:28px; }
+  .reg-title { font-size:18px; font-weight:700; margin-bottom:4px; }
+  .reg-sub { font-size:13px; color:var(--muted); margin-bottom:20px; }
+  .form-group { display:flex; flex-direction:column; gap:7px; margin-bottom:14px; }
+  label { font-size:12px; color:var(--muted); font-weight:600; letter-spacing:0.5px; text-transform:uppercase; }
+  input {
     background: var(--surface); border: 1px solid var(--border); border-radius: 10px;
     padding: 13px 15px; color: var(--text); font-family:'DM Sans',sans-serif;
     font-size: 14px; outline: none; transition: border-color 0.2s; width:100%;
-  }}
-  input:focus {{ border-color: var(--accent); box-shadow: 0 0 0 3px var(--accent-dim); }}
-  input::placeholder {{ color: #3a3a50; }}
+  }
+  input:focus { border-color: var(--accent); box-shadow: 0 0 0 3px var(--accent-dim); }
+  input::placeholder { color: #3a3a50; }
 
-  .toast {{
+  .toast {
     position: fixed; bottom: 24px; left:50%;
     transform: translateX(-50%) translateY(80px);
     background: var(--card); border:1px solid var(--border);
@@ -895,197 +2375,129 @@ def build_student_html(leader: LeaderProfile) -> str:
     font-size: 14px; font-weight: 500;
     z-index: 999; transition: transform 0.3s cubic-bezier(0.34,1.56,0.64,1);
     white-space: nowrap;
-  }}
-  .toast.show {{ transform: translateX(-50%) translateY(0); }}
-  #confetti-canvas {{ position:fixed; inset:0; pointer-events:none; z-index:999; }}
-</style>
-</head>
-<body>
-<canvas id="confetti-canvas"></canvas>
-<div id="app">
+  }
+  .toast.show { transform: translateX(-50%) translateY(0); }
+  #confetti-canvas { position:fixed; inset:0; pointer-events:none; z-index:999; }
+"""
 
-  <!-- LANDING -->
-  <div class="screen active" id="s-land">
-    <div class="campaign-hero">
-      <div class="election-badge"><span class="pulse-dot"></span> Election 2024</div>
-      <div class="hero-name">{name}</div>
-      <div class="hero-position">{position}</div>
-      <div class="hero-slogan">"{slogan}"</div>
-      <p class="hero-question">
-        Think you know your candidate?<br>
-        <strong>Test yourself. Learn the truth. Make the right vote.</strong>
-      </p>
-    </div>
+STUDENT_JS = """const API = CAMPAIGN.api || '';
 
-    <div class="reg-card">
-      <div class="reg-title">Join the Quiz</div>
-      <div class="reg-sub">Register to save your score on the leaderboard</div>
-      <div class="form-group"><label>Your Name</label><input id="reg-name" type="text" placeholder="e.g. Kwame Mensah" /></div>
-      <div class="form-group"><label>Phone Number</label><input id="reg-phone" type="tel" placeholder="+233 XX XXX XXXX" /></div>
-      <div class="form-group"><label>Referral Code (optional)</label><input id="reg-ref" type="text" placeholder="From a friend?" style="text-transform:uppercase" /></div>
-      <button class="btn btn-primary" style="width:100%;margin-top:6px" onclick="handleRegister()">START THE QUIZ →</button>
-    </div>
+function variantCount() {
+  return CAMPAIGN.questionBank ? CAMPAIGN.questionBank.variants : CAMPAIGN.variants;
+}
 
-    <button class="btn btn-outline" onclick="showScreen('s-lb'); loadLeaderboard()">🏆 View Leaderboard</button>
-  </div>
+// The variant a level starts with: the next on the walk /register gave this student
+// (their variants in play order, the first not played yet), else a random one.
+// Every URL is cacheable.
+function nextVariant(level) {
+  const walk = state.variants[level];
+  return walk ? walk[0] % variantCount() : Math.floor(Math.random() * variantCount());
+}
 
-  <!-- LEVEL SELECT -->
-  <div class="screen" id="s-levels">
-    <div style="text-align:center">
-      <div style="font-family:'Bebas Neue',sans-serif;font-size:32px;letter-spacing:2px">CHOOSE YOUR LEVEL</div>
-      <div style="font-size:13px;color:var(--muted);margin-top:4px">Complete all 3 to unlock the full picture</div>
-    </div>
-    <div class="level-cards">
-      <div class="level-card" style="--lc:#00b4d8" onclick="startLevel(1)">
-        <div class="level-icon">🏆</div>
-        <div class="level-info">
-          <div class="level-label">Level 1</div>
-          <div class="level-title">What They've Done</div>
-          <div class="level-desc">Real achievements. Real impact. Judge the record.</div>
-        </div>
-        <div class="level-arrow">›</div>
-      </div>
-      <div class="level-card" style="--lc:#ffa500" id="lc-2" onclick="startLevel(2)">
-        <div class="level-icon">📋</div>
-        <div class="level-info">
-          <div class="level-label">Level 2</div>
-          <div class="level-title">The Vision</div>
-          <div class="level-desc">Plans, promises and the future they're building for you.</div>
-        </div>
-        <div class="level-arrow">›</div>
-      </div>
-      <div class="level-card" style="--lc:#00c864" id="lc-3" onclick="startLevel(3)">
-        <div class="level-icon">😄</div>
-        <div class="level-info">
-          <div class="level-label">Level 3</div>
-          <div class="level-title">Know Your Leader</div>
-          <div class="level-desc">The human behind the campaign. Hobbies, jokes & personality.</div>
-        </div>
-        <div class="level-arrow">›</div>
-      </div>
-    </div>
-    <div id="live-score-bar" style="text-align:center;font-size:13px;color:var(--muted)">
-      Total Score: <span style="color:var(--accent);font-family:'Bebas Neue',sans-serif;font-size:20px" id="total-score-display">0</span> pts
-    </div>
-  </div>
-
-  <!-- QUIZ -->
-  <div class="screen" id="s-quiz">
-    <div class="quiz-header">
-      <div class="quiz-level-tag" id="quiz-level-tag">LEVEL 1</div>
-      <div class="timer safe" id="timer">30</div>
-    </div>
-    <div class="progress-bar"><div class="progress-fill" id="prog-fill" style="width:20%"></div></div>
-    <div class="question-card">
-      <div class="q-num" id="q-num">Question 1 of 5</div>
-      <div class="q-text" id="q-text">Loading...</div>
-      <div class="options" id="options"></div>
-      <div class="explanation" id="explanation"></div>
-    </div>
-    <div class="score-pop" id="score-pop"></div>
-  </div>
+function questionsUrl(level, variant) {
+  const bank = CAMPAIGN.questionBank;
+  if (bank) return `${bank.path}/level-${level}/${variant}.json`;
+  return `${API}/questions?level=${level}&variant=${variant}&v=${CAMPAIGN.version}`;
+}
 
-  <!-- RESULT -->
-  <div class="screen" id="s-result">
-    <div class="result-hero">
-      <div class="result-emoji" id="res-emoji">🎉</div>
-      <div class="result-score-big" id="res-score">0</div>
-      <div class="result-label">POINTS THIS ROUND</div>
-      <div class="result-verdict" id="res-verdict">Great effort!</div>
-      <div class="result-cta" id="res-cta">Loading...</div>
-    </div>
-    <div class="stat-strip">
-      <div class="stat-box"><div class="stat-val" id="res-correct">0/5</div><div class="stat-lbl">Correct</div></div>
-      <div class="stat-box"><div class="stat-val" id="res-streak">0</div><div class="stat-lbl">Best Streak</div></div>
-      <div class="stat-box"><div class="stat-val" id="res-total">0</div><div class="stat-lbl">Total Pts</div></div>
-    </div>
-    <div class="referral-section">
-      <div class="ref-title">📣 Spread the Word</div>
-      <div class="ref-sub">Share your code with fellow students — when they join, you earn bonus retries AND you help {name} get more votes!</div>
-      <div class="ref-code" id="ref-code" onclick="copyRef()">••••••••</div>
-      <p style="text-align:center;font-size:12px;color:var(--muted);margin-top:8px">Tap to copy</p>
-    </div>
-    <button class="btn btn-primary" onclick="showScreen('s-levels')">NEXT LEVEL →</button>
-    <button class="btn btn-outline" onclick="showScreen('s-lb'); loadLeaderboard()">🏆 Leaderboard</button>
-    <button class="btn btn-outline" onclick="goHome()">← Back to Start</button>
-  </div>
+// All three levels in one round trip, started as soon as the student is registered.
+// New students start every level on the same variant, so one URL covers them all.
+let prefetch = null, prefetchVariant = null;
 
-  <!-- LEADERBOARD -->
-  <div class="screen" id="s-lb">
-    <div style="text-align:center;padding:28px 0 8px">
-      <div style="font-family:'Bebas Neue',sans-serif;font-size:14px;letter-spacing:3px;color:var(--muted)">TOP SUPPORTERS</div>
-      <div style="font-family:'Bebas Neue',sans-serif;font-size:36px;letter-spacing:2px">{name.upper()}</div>
-    </div>
-    <div id="lb-list" style="display:flex;flex-direction:column;gap:10px">
-      <p style="text-align:center;color:var(--muted)">Loading...</p>
-    </div>
-    <button class="btn btn-outline" onclick="goHome()">← Back</button>
-  </div>
+function prefetchQuestions() {
+  if (CAMPAIGN.questionBank || prefetch) return;
+  prefetchVariant = nextVariant(1);
+  prefetch = fetch(`${API}/questions/all?variant=${prefetchVariant}&v=${CAMPAIGN.version}`)
+    .then(res => res.ok ? res.json() : {})
+    .catch(() => ({}));
+}
 
-</div>
-<div class="toast" id="toast"></div>
+// Variants next to each other on the walk share no items, so a retry moves on to
+// the next one; the server remembers the start so a later visit continues from there.
+function startedVariant(level, variant) {
+  const walk = state.variants[level];
+  if (!walk) return;
+  walk.push(walk.shift());  // comes round again once every other variant has been played
+  fetch(`${API}/questions/seen?user_id=${state.userId}&level=${level}&variant=${variant}`, {method:'POST', keepalive:true})
+    .catch(() => {});
+}
 
-<script>
-const API = '';
-const LEVELS = {{
-  1: {{ tag:'LEVEL 1 — ACHIEVEMENTS', color:'#00b4d8' }},
-  2: {{ tag:'LEVEL 2 — MANIFESTO', color:'#ffa500' }},
-  3: {{ tag:'LEVEL 3 — PERSONALITY', color:'#00c864' }},
-}};
+async function loadQuestions(level) {
+  const tracked = state.variants[level] !== undefined;
+  const levels = prefetch ? await prefetch : {};
+  let variant = nextVariant(level), questions;
+  if (levels[level] && (!tracked || variant === prefetchVariant)) {
+    questions = levels[level];
+    variant = prefetchVariant;
+    delete levels[level];  // a retry of this level fetches another set
+  } else {
+    const res = await fetch(questionsUrl(level, variant));
+    questions = await res.json();
+  }
+  startedVariant(level, variant);
+  return questions;
+}
+const LEVELS = {
+  1: { tag:'LEVEL 1 — ACHIEVEMENTS', color:'#00b4d8' },
+  2: { tag:'LEVEL 2 — MANIFESTO', color:'#ffa500' },
+  3: { tag:'LEVEL 3 — PERSONALITY', color:'#00c864' },
+};
 
 const VOTE_CTAS = [
-  "Every question you answered correctly proves {name} has the vision students need. Make your vote count! 🗳️",
-  "You just learned why {name} is the real deal. Tell 5 friends and get them to quiz too!",
-  "Knowledge is power — and now you're powered up. Vote {name} on election day! 💪",
-  "You know the record. You know the vision. You know the person. The choice is clear. Vote {name}!",
+  `Every question you answered correctly proves ${CAMPAIGN.name} has the vision students need. Make your vote count! 🗳️`,
+  `You just learned why ${CAMPAIGN.name} is the real deal. Tell 5 friends and get them to quiz too!`,
+  `Knowledge is power — and now you're powered up. Vote ${CAMPAIGN.name} on election day! 💪`,
+  `You know the record. You know the vision. You know the person. The choice is clear. Vote ${CAMPAIGN.name}!`,
   "Share this quiz with every student you know. The more who know, the more who vote right! 🔥",
 ];
 
-let state = {{
-  userId: null, userName: '', referralCode: '',
+let state = {
+  userId: null, userName: '', referralCode: '', variants: {},
   retriesLeft: 1, totalScore: 0,
   currentLevel: 1, questions: [],
   currentQ: 0, levelScore: 0,
   correctCount: 0, streak: 0, bestStreak: 0,
   answered: false, timerInterval: null, timeLeft: 30,
   completedLevels: [],
-}};
+};
 
-function showScreen(id) {{
+function showScreen(id) {
   document.querySelectorAll('.screen').forEach(s => s.classList.remove('active'));
   document.getElementById(id).classList.add('active');
-}}
+}
 
-function goHome() {{ stopTimer(); showScreen('s-land'); }}
+function goHome() { stopTimer(); showScreen('s-land'); }
 
-function showToast(msg) {{
+function showToast(msg) {
   const t = document.getElementById('toast');
   t.textContent = msg; t.classList.add('show');
   setTimeout(() => t.classList.remove('show'), 3000);
-}}
+}
 
 let countdownSecs = 167253;
-setInterval(() => {{ countdownSecs = Math.max(0, countdownSecs-1); }}, 1000);
+setInterval(() => { countdownSecs = Math.max(0, countdownSecs-1); }, 1000);
 
-async function handleRegister() {{
+async function handleRegister() {
   const name = document.getElementById('reg-name').value.trim();
   const phone = document.getElementById('reg-phone').value.trim();
   const ref = document.getElementById('reg-ref').value.trim();
   if (!name || !phone) return showToast('Please enter your name and phone 👋');
-  try {{
-    const res = await fetch('/register', {{ method:'POST', headers:{{'Content-Type':'application/json'}}, body: JSON.stringify({{name, phone, referred_by: ref||null}}) }});
+  try {
+    const res = await fetch(API + '/register', { method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({name, phone, referred_by: ref||null}) });
     const d = await res.json();
     state.userId = d.id; state.userName = d.name;
     state.referralCode = d.referral_code; state.retriesLeft = d.retries_left;
-  }} catch {{
+    state.variants = d.variants || {};
+  } catch {
     state.userId = 'demo-'+Date.now(); state.userName = name;
     state.referralCode = 'QUIZ'+Math.random().toString(36).slice(2,6).toUpperCase();
     state.retriesLeft = 1;
-  }}
+  }
+  prefetchQuestions();
   showScreen('s-levels');
-}}
+}
 
-async function startLevel(level) {{
+async function startLevel(level) {
   state.currentLevel = level;
   state.questions = []; state.currentQ = 0;
   state.levelScore = 0; state.correctCount = 0;
@@ -1099,21 +2511,20 @@ async function startLevel(level) {{
 
   showScreen('s-quiz');
 
-  try {{
-    const res = await fetch('/questions?level=' + level);
-    state.questions = await res.json();
-  }} catch {{
-    state.questions = Array(5).fill({{
-      question: "Why is {name} the best candidate for students?",
+  try {
+    state.questions = await loadQuestions(level);
+  } catch {
+    state.questions = Array(5).fill({
+      question: `Why is ${CAMPAIGN.name} the best candidate for students?`,
       options: ["Proven track record","Clear vision","Genuine care for students","All of the above"],
       answer: "D",
-      explanation: "{name} embodies all of these qualities — that's why students trust them."
-    }});
-  }}
+      explanation: `${CAMPAIGN.name} embodies all of these qualities — that's why students trust them.`
+    });
+  }
   renderQuestion();
-}}
+}
 
-function renderQuestion() {{
+function renderQuestion() {
   const q = state.questions[state.currentQ];
   if (!q) return endLevel();
   state.answered = false; state.timeLeft = 30;
@@ -1121,50 +2532,50 @@ function renderQuestion() {{
   document.getElementById('score-pop').textContent = '';
 
   const total = state.questions.length;
-  document.getElementById('q-num').textContent = `Question ${{state.currentQ+1}} of ${{total}}`;
-  document.getElementById('prog-fill').style.width = `${{((state.currentQ+1)/total)*100}}%`;
+  document.getElementById('q-num').textContent = `Question ${state.currentQ+1} of ${total}`;
+  document.getElementById('prog-fill').style.width = `${((state.currentQ+1)/total)*100}%`;
   document.getElementById('q-text').textContent = q.question;
 
   const letters = ['A','B','C','D'];
   const container = document.getElementById('options');
   container.innerHTML = '';
-  (q.options || []).forEach((opt, i) => {{
+  (q.options || []).forEach((opt, i) => {
     const div = document.createElement('div');
     div.className = 'option';
-    div.innerHTML = `<span class="opt-letter">${{letters[i]}}</span><span>${{opt}}</span>`;
+    div.innerHTML = `<span class="opt-letter">${letters[i]}</span><span>${opt}</span>`;
     div.onclick = () => selectAnswer(i, q.answer, q.explanation);
     container.appendChild(div);
-  }});
+  });
   startTimer();
-}}
+}
 
-function startTimer() {{
+function startTimer() {
   stopTimer(); updateTimer();
-  state.timerInterval = setInterval(() => {{
+  state.timerInterval = setInterval(() => {
     state.timeLeft--;
     updateTimer();
-    if (state.timeLeft <= 0) {{
+    if (state.timeLeft <= 0) {
       stopTimer();
-      if (!state.answered) {{
+      if (!state.answered) {
         state.streak = 0;
         showToast("⏰ Time's up!");
         lockOptions(null, state.questions[state.currentQ].answer);
         showExplanation(state.questions[state.currentQ].explanation);
         setTimeout(nextQ, 2000);
-      }}
-    }}
-  }}, 1000);
-}}
+      }
+    }
+  }, 1000);
+}
 
-function stopTimer() {{ clearInterval(state.timerInterval); }}
+function stopTimer() { clearInterval(state.timerInterval); }
 
-function updateTimer() {{
+function updateTimer() {
   const el = document.getElementById('timer');
   el.textContent = state.timeLeft;
   el.className = 'timer ' + (state.timeLeft <= 5 ? 'danger' : state.timeLeft <= 10 ? 'warn' : 'safe');
-}}
+}
 
-function selectAnswer(idx, correctLetter, explanation) {{
+function selectAnswer(idx, correctLetter, explanation) {
   if (state.answered) return;
   state.answered = true; stopTimer();
   const letters = ['A','B','C','D'];
@@ -1172,48 +2583,49 @@ function selectAnswer(idx, correctLetter, explanation) {{
   lockOptions(letters[idx], correctLetter);
   showExplanation(explanation);
 
-  if (isCorrect) {{
+  if (isCorrect) {
     state.streak++; state.bestStreak = Math.max(state.bestStreak, state.streak);
     state.correctCount++;
     const pts = 100 + (state.timeLeft * 3) + (state.streak >= 3 ? 50 : 0);
     state.levelScore += pts; state.totalScore += pts;
-    document.getElementById('score-pop').textContent = `+${{pts}} pts${{state.streak >= 3 ? ' 🔥' : ''}}`;
+    document.getElementById('score-pop').textContent = `+${pts} pts${state.streak >= 3 ? ' 🔥' : ''}`;
     document.getElementById('total-score-display').textContent = state.totalScore;
-  }} else {{
+  } else {
     state.streak = 0;
-    document.getElementById('score-pop').textContent = `Correct: ${{correctLetter}}`;
-  }}
+    document.getElementById('score-pop').textContent = `Correct: ${correctLetter}`;
+  }
   setTimeout(nextQ, 2200);
-}}
+}
 
-function lockOptions(chosenLetter, correctLetter) {{
+function lockOptions(chosenLetter, correctLetter) {
   const letters = ['A','B','C','D'];
-  document.querySelectorAll('.option').forEach((el, i) => {{
+  document.querySelectorAll('.option').forEach((el, i) => {
     el.classList.add('locked');
     if (letters[i] === correctLetter) el.classList.add('correct');
     else if (letters[i] === chosenLetter) el.classList.add('wrong');
-  }});
-}}
+  });
+}
 
-function showExplanation(text) {{
+function showExplanation(text) {
   if (!text) return;
   const el = document.getElementById('explanation');
   el.textContent = '💡 ' + text;
   el.style.display = 'block';
-}}
+}
 
-function nextQ() {{
+function nextQ() {
   state.currentQ++;
   state.currentQ >= state.questions.length ? endLevel() : renderQuestion();
-}}
+}
 
-async function endLevel() {{
+async function endLevel() {
   stopTimer();
   state.completedLevels.push(state.currentLevel);
 
-  try {{
-    await fetch(`/submit-score?user_id=${{state.userId}}&score=${{state.totalScore}}`, {{method:'POST'}});
-  }} catch {{}}
+  try {
+    await fetch(`${API}/submit-score?user_id=${state.userId}&score=${state.totalScore}`, {method:'POST'});
+  } catch {}
+  showRank();
 
   const pct = Math.round((state.correctCount / state.questions.length) * 100);
   const emojis = pct >= 80 ? '🏆' : pct >= 60 ? '🎉' : pct >= 40 ? '👍' : '💪';
@@ -1228,7 +2640,7 @@ async function endLevel() {{
   document.getElementById('res-emoji').textContent = emojis;
   document.getElementById('res-score').textContent = state.levelScore.toLocaleString();
   document.getElementById('res-verdict').textContent = v[1];
-  document.getElementById('res-correct').textContent = `${{state.correctCount}}/5`;
+  document.getElementById('res-correct').textContent = `${state.correctCount}/5`;
   document.getElementById('res-streak').textContent = state.bestStreak;
   document.getElementById('res-total').textContent = state.totalScore.toLocaleString();
   document.getElementById('ref-code').textContent = state.referralCode;
@@ -1236,91 +2648,344 @@ async function endLevel() {{
 
   showScreen('s-result');
   if (pct >= 80) launchConfetti();
-}}
+}
+
+async function showRank() {
+  const el = document.getElementById('res-rank');
+  el.textContent = '';
+  try {
+    const res = await fetch(`${API}/rank/${state.userId}`);
+    if (!res.ok) return;
+    const r = await res.json();
+    el.textContent = r.eligible
+      ? `You're #${r.rank.toLocaleString()} on the leaderboard`
+      : `You'll enter the leaderboard at #${r.rank.toLocaleString()}`;
+  } catch {}
+}
 
-async function loadLeaderboard() {{
+async function loadLeaderboard() {
   const list = document.getElementById('lb-list');
   list.innerHTML = '<p style="text-align:center;color:var(--muted)">Loading...</p>';
   let entries = [];
-  try {{
-    const res = await fetch('/leaderboard');
+  try {
+    const res = await fetch(API + '/leaderboard');
     entries = await res.json();
-  }} catch {{
+  } catch {
     entries = [
-      {{rank:1,name:'Ama K.',score:2800}},
-      {{rank:2,name:'Kweku O.',score:2450}},
-      {{rank:3,name:'Priscilla T.',score:2100}},
+      {rank:1,name:'Ama K.',score:2800},
+      {rank:2,name:'Kweku O.',score:2450},
+      {rank:3,name:'Priscilla T.',score:2100},
     ];
-  }}
+  }
   const medals = ['🥇','🥈','🥉'];
   const cls = ['gold','silver','bronze'];
   list.innerHTML = '';
-  entries.forEach((u,i) => {{
+  entries.forEach((u,i) => {
     const div = document.createElement('div');
-    div.className = `lb-item ${{cls[i]||''}}`;
-    div.innerHTML = `<div class="lb-rank">${{medals[i]||u.rank}}</div><div class="lb-name">${{u.name}}</div><div class="lb-score">${{u.score.toLocaleString()}}</div>`;
+    div.className = `lb-item ${cls[i]||''}`;
+    div.innerHTML = `<div class="lb-rank">${medals[i]||u.rank}</div><div class="lb-name">${u.name}</div><div class="lb-score">${u.score.toLocaleString()}</div>`;
     list.appendChild(div);
-  }});
-  if (state.userName) {{
+  });
+  if (state.userName) {
     const self = document.createElement('div');
     self.className = 'lb-item'; self.style.borderColor = 'var(--accent)';
-    self.innerHTML = `<div class="lb-rank">👤</div><div class="lb-name">${{state.userName}} <span style="font-size:11px;color:var(--accent)">(You)</span></div><div class="lb-score">${{state.totalScore.toLocaleString()}}</div>`;
+    self.innerHTML = `<div class="lb-rank">👤</div><div class="lb-name">${state.userName} <span style="font-size:11px;color:var(--accent)">(You)</span></div><div class="lb-score">${state.totalScore.toLocaleString()}</div>`;
     list.appendChild(self);
-  }}
-}}
+  }
+}
 
-function copyRef() {{
+function copyRef() {
   if (!state.referralCode) return;
-  navigator.clipboard.writeText(state.referralCode).then(() => showToast('Code copied! Share it 🎉')).catch(() => {{}});
-}}
+  navigator.clipboard.writeText(state.referralCode).then(() => showToast('Code copied! Share it 🎉')).catch(() => {});
+}
 
-function launchConfetti() {{
+function launchConfetti() {
   const canvas = document.getElementById('confetti-canvas');
   const ctx = canvas.getContext('2d');
   canvas.width = window.innerWidth; canvas.height = window.innerHeight;
   const color = getComputedStyle(document.documentElement).getPropertyValue('--accent').trim();
-  const particles = Array.from({{length:150}}, () => ({{
+  const particles = Array.from({length:150}, () => ({
     x: Math.random()*canvas.width, y: -20,
     vx: (Math.random()-0.5)*5, vy: Math.random()*5+2,
     color: [color,'#ffd60a','#06d6a0','#fff','#ff6b6b'][Math.floor(Math.random()*5)],
     size: Math.random()*9+4, rot: Math.random()*360, rs: (Math.random()-0.5)*8
-  }}));
+  }));
   let frame;
-  (function draw() {{
+  (function draw() {
     ctx.clearRect(0,0,canvas.width,canvas.height);
-    particles.forEach(p => {{
+    particles.forEach(p => {
       p.x+=p.vx; p.y+=p.vy; p.rot+=p.rs;
       ctx.save(); ctx.translate(p.x,p.y); ctx.rotate(p.rot*Math.PI/180);
       ctx.fillStyle=p.color; ctx.fillRect(-p.size/2,-p.size/2,p.size,p.size*0.5);
       ctx.restore();
-    }});
+    });
     if (particles.some(p=>p.y<canvas.height+50)) frame=requestAnimationFrame(draw);
     else ctx.clearRect(0,0,canvas.width,canvas.height);
-  }})();
-  setTimeout(()=>{{cancelAnimationFrame(frame);ctx.clearRect(0,0,canvas.width,canvas.height);}},5000);
-}}
-</script>
-</body>
-</html>"""
+  })();
+  setTimeout(()=>{cancelAnimationFrame(frame);ctx.clearRect(0,0,canvas.width,canvas.height);},5000);
+}
+"""
 
+# Fingerprinted so browsers can keep them for a year; a new build gets a new URL
+STATIC_ASSETS: dict[str, PreparedPage] = {}
 
-# ─── ROUTES ───────────────────────────────────────────────────────────────────
-@app.get("/", response_class=HTMLResponse)
-def student_quiz(db: Session = Depends(get_db)):
-    leader = get_leader(db)
-    return HTMLResponse(content=build_student_html(leader))
 
+def register_static(stem: str, ext: str, content: str, media_type: str) -> str:
+    asset = PreparedPage(content, media_type=media_type, cache_control=IMMUTABLE)
+    digest = asset.etag.strip('"')[:12]
+    filename = f"{stem}.{digest}.{ext}"
+    STATIC_ASSETS[filename] = asset
+    return f"/static/{filename}"
+
+
+STUDENT_CSS_URL = register_static("app", "css", STUDENT_CSS, "text/css; charset=utf-8")
+STUDENT_JS_URL = register_static("app", "js", STUDENT_JS, "text/javascript; charset=utf-8")
+
+
+def build_student_html(leader: LeaderSnapshot, api_base: str = "", question_bank: dict | None = None) -> str:
+    """Per-campaign HTML shell; all CSS and JS live in the fingerprinted static assets.
+
+    api_base and question_bank are only set by the static export, which points the
+    page at the API host and at pre-generated question files.
+    """
+    color = leader.campaign_color or "#e63946"
+    name = leader.name or "Our Candidate"
+    position = leader.position or "Student Leader"
+    slogan = leader.slogan or "The Right Choice."
+    config = {"name": name, "api": api_base, "version": leader.version, "variants": QUESTION_BANK_SIZE}
+    if question_bank:
+        config["questionBank"] = question_bank
+    config = json.dumps(config).replace("</", "<\\/")
+
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>Do You Really Know {name}?</title>
+<link href="https://fonts.googleapis.com/css2?family=Bebas+Neue&family=DM+Sans:wght@300;400;500;600&display=swap" rel="stylesheet">
+<link href="{STUDENT_CSS_URL}" rel="stylesheet">
+<style>
+  :root {{
+    --accent: {color};
+    --accent-dim: {color}22;
+    --accent-glow: {color}44;
+    --accent-08: {color}08;
+    --accent-15: {color}15;
+    --accent-18: {color}18;
+    --accent-30: {color}30;
+  }}
+</style>
+</head>
+<body>
+<canvas id="confetti-canvas"></canvas>
+<div id="app">
+
+  <!-- LANDING -->
+  <div class="screen active" id="s-land">
+    <div class="campaign-hero">
+      <div class="election-badge"><span class="pulse-dot"></span> Election 2024</div>
+      <div class="hero-name">{name}</div>
+      <div class="hero-position">{position}</div>
+      <div class="hero-slogan">"{slogan}"</div>
+      <p class="hero-question">
+        Think you know your candidate?<br>
+        <strong>Test yourself. Learn the truth. Make the right vote.</strong>
+      </p>
+    </div>
+
+    <div class="reg-card">
+      <div class="reg-title">Join the Quiz</div>
+      <div class="reg-sub">Register to save your score on the leaderboard</div>
+      <div class="form-group"><label>Your Name</label><input id="reg-name" type="text" placeholder="e.g. Kwame Mensah" /></div>
+      <div class="form-group"><label>Phone Number</label><input id="reg-phone" type="tel" placeholder="+233 XX XXX XXXX" /></div>
+      <div class="form-group"><label>Referral Code (optional)</label><input id="reg-ref" type="text" placeholder="From a friend?" style="text-transform:uppercase" /></div>
+      <button class="btn btn-primary" style="width:100%;margin-top:6px" onclick="handleRegister()">START THE QUIZ →</button>
+    </div>
+
+    <button class="btn btn-outline" onclick="showScreen('s-lb'); loadLeaderboard()">🏆 View Leaderboard</button>
+  </div>
+
+  <!-- LEVEL SELECT -->
+  <div class="screen" id="s-levels">
+    <div style="text-align:center">
+      <div style="font-family:'Bebas Neue',sans-serif;font-size:32px;letter-spacing:2px">CHOOSE YOUR LEVEL</div>
+      <div style="font-size:13px;color:var(--muted);margin-top:4px">Complete all 3 to unlock the full picture</div>
+    </div>
+    <div class="level-cards">
+      <div class="level-card" style="--lc:#00b4d8" onclick="startLevel(1)">
+        <div class="level-icon">🏆</div>
+        <div class="level-info">
+          <div class="level-label">Level 1</div>
+          <div class="level-title">What They've Done</div>
+          <div class="level-desc">Real achievements. Real impact. Judge the record.</div>
+        </div>
+        <div class="level-arrow">›</div>
+      </div>
+      <div class="level-card" style="--lc:#ffa500" id="lc-2" onclick="startLevel(2)">
+        <div class="level-icon">📋</div>
+        <div class="level-info">
+          <div class="level-label">Level 2</div>
+          <div class="level-title">The Vision</div>
+          <div class="level-desc">Plans, promises and the future they're building for you.</div>
+        </div>
+        <div class="level-arrow">›</div>
+      </div>
+      <div class="level-card" style="--lc:#00c864" id="lc-3" onclick="startLevel(3)">
+        <div class="level-icon">😄</div>
+        <div class="level-info">
+          <div class="level-label">Level 3</div>
+          <div class="level-title">Know Your Leader</div>
+          <div class="level-desc">The human behind the campaign. Hobbies, jokes & personality.</div>
+        </div>
+        <div class="level-arrow">›</div>
+      </div>
+    </div>
+    <div id="live-score-bar" style="text-align:center;font-size:13px;color:var(--muted)">
+      Total Score: <span style="color:var(--accent);font-family:'Bebas Neue',sans-serif;font-size:20px" id="total-score-display">0</span> pts
+    </div>
+  </div>
+
+  <!-- QUIZ -->
+  <div class="screen" id="s-quiz">
+    <div class="quiz-header">
+      <div class="quiz-level-tag" id="quiz-level-tag">LEVEL 1</div>
+      <div class="timer safe" id="timer">30</div>
+    </div>
+    <div class="progress-bar"><div class="progress-fill" id="prog-fill" style="width:20%"></div></div>
+    <div class="question-card">
+      <div class="q-num" id="q-num">Question 1 of 5</div>
+      <div class="q-text" id="q-text">Loading...</div>
+      <div class="options" id="options"></div>
+      <div class="explanation" id="explanation"></div>
+    </div>
+    <div class="score-pop" id="score-pop"></div>
+  </div>
+
+  <!-- RESULT -->
+  <div class="screen" id="s-result">
+    <div class="result-hero">
+      <div class="result-emoji" id="res-emoji">🎉</div>
+      <div class="result-score-big" id="res-score">0</div>
+      <div class="result-label">POINTS THIS ROUND</div>
+      <div class="result-verdict" id="res-verdict">Great effort!</div>
+      <div class="result-label" id="res-rank"></div>
+      <div class="result-cta" id="res-cta">Loading...</div>
+    </div>
+    <div class="stat-strip">
+      <div class="stat-box"><div class="stat-val" id="res-correct">0/5</div><div class="stat-lbl">Correct</div></div>
+      <div class="stat-box"><div class="stat-val" id="res-streak">0</div><div class="stat-lbl">Best Streak</div></div>
+      <div class="stat-box"><div class="stat-val" id="res-total">0</div><div class="stat-lbl">Total Pts</div></div>
+    </div>
+    <div class="referral-section">
+      <div class="ref-title">📣 Spread the Word</div>
+      <div class="ref-sub">Share your code with fellow students — when they join, you earn bonus retries AND you help {name} get more votes!</div>
+      <div class="ref-code" id="ref-code" onclick="copyRef()">••••••••</div>
+      <p style="text-align:center;font-size:12px;color:var(--muted);margin-top:8px">Tap to copy</p>
+    </div>
+    <button class="btn btn-primary" onclick="showScreen('s-levels')">NEXT LEVEL →</button>
+    <button class="btn btn-outline" onclick="showScreen('s-lb'); loadLeaderboard()">🏆 Leaderboard</button>
+    <button class="btn btn-outline" onclick="goHome()">← Back to Start</button>
+  </div>
+
+  <!-- LEADERBOARD -->
+  <div class="screen" id="s-lb">
+    <div style="text-align:center;padding:28px 0 8px">
+      <div style="font-family:'Bebas Neue',sans-serif;font-size:14px;letter-spacing:3px;color:var(--muted)">TOP SUPPORTERS</div>
+      <div style="font-family:'Bebas Neue',sans-serif;font-size:36px;letter-spacing:2px">{name.upper()}</div>
+    </div>
+    <div id="lb-list" style="display:flex;flex-direction:column;gap:10px">
+      <p style="text-align:center;color:var(--muted)">Loading...</p>
+    </div>
+    <button class="btn btn-outline" onclick="goHome()">← Back</button>
+  </div>
+
+</div>
+<div class="toast" id="toast"></div>
+
+<script>const CAMPAIGN = {config};</script>
+<script src="{STUDENT_JS_URL}"></script>
+</body>
+</html>"""
 
-@app.get("/setup", response_class=HTMLResponse)
-def setup_page():
-    return HTMLResponse(content=SETUP_HTML)
 
+def student_page(leader: LeaderSnapshot) -> PreparedPage:
+    # A campaign with a slug calls its API under /c/<slug>/, which works on any host it is served from
+    api_base = f"/c/{leader.slug}" if leader.slug else ""
+    return cached(leader, "student_page", lambda: PreparedPage(build_student_html(leader, api_base=api_base)))
 
-@app.post("/setup")
-def save_profile(payload: LeaderProfileUpdate, db: Session = Depends(get_db)):
-    if payload.password != SETUP_PASSWORD:
+
+# ─── ROUTES ───────────────────────────────────────────────────────────────────
+@campaign_routes.get("/", response_class=HTMLResponse)
+def student_quiz(request: Request, campaign_id: int = Depends(resolve_campaign), db: Session = Depends(get_db)):
+    return student_page(get_leader(db, campaign_id)).respond(request)
+
+
+@campaign_routes.get("/setup", response_class=HTMLResponse)
+def setup_page(request: Request):
+    return SETUP_PAGE.respond(request)
+
+
+@app.get("/static/{filename}")
+def static_asset(filename: str, request: Request):
+    asset = STATIC_ASSETS.get(filename)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return asset.respond(request)
+
+
+def check_setup_password(leader: LeaderProfile, password: str) -> bool:
+    """The campaign's own password; the default campaign accepts SETUP_PASSWORD until it has one."""
+    if leader.setup_password:
+        return check_password(password, leader.setup_password)
+    return leader.id == DEFAULT_CAMPAIGN_ID and hmac.compare_digest(password.encode(), SETUP_PASSWORD.encode())
+
+
+@campaign_routes.post("/setup")
+def save_profile(payload: LeaderProfileUpdate, request: Request, db: Session = Depends(get_db)):
+    """Save a campaign's profile with its setup password.
+
+    With the admin password the save may also create the campaign (the first save
+    under /c/<slug>/setup), sets its setup password to `password`, and may set or
+    remove its custom domain. A domain is refused if it is one the deployment
+    answers on (APP_HOSTNAMES, or the host this request came in on), since
+    resolve_campaign would then send the whole site to this campaign.
+    """
+    admin = is_admin(payload.admin_password)
+    if payload.admin_password and not admin:
+        raise HTTPException(status_code=403, detail="Wrong admin password")
+    if admin and len(payload.password) < 8:
+        raise HTTPException(status_code=400, detail="Campaign passwords need at least 8 characters")
+    slug = request.path_params.get("slug")
+    if slug is None:
+        leader = load_leader_row(db, resolve_campaign(request, db))
+    elif not SLUG.fullmatch(slug.lower()):
+        raise HTTPException(status_code=400, detail="Campaign slugs use lowercase letters, digits and dashes")
+    elif admin:
+        leader = create_campaign(db, slug.lower(), payload.password)
+    else:
+        leader = db.query(LeaderProfile).filter(LeaderProfile.slug == slug.lower()).first()
+        if leader is None:
+            raise HTTPException(status_code=403, detail="Creating a campaign needs the admin password")
+    if admin:
+        if not (leader.setup_password and check_password(payload.password, leader.setup_password)):
+            leader.setup_password = hash_password(payload.password)
+    elif not check_setup_password(leader, payload.password):
         raise HTTPException(status_code=403, detail="Wrong password")
-    leader = get_leader(db)
+    hostname = (payload.hostname or "").strip().lower() or None
+    clear = payload.clear_hostname and leader.hostname is not None
+    if hostname == leader.hostname:
+        hostname = None  # unchanged
+    if (hostname or clear) and not admin:
+        raise HTTPException(status_code=403, detail="Changing the custom domain needs the admin password")
+    if clear:
+        leader.hostname = None
+    elif hostname:
+        if hostname in APP_HOSTNAMES or hostname == request.headers.get("host", "").rsplit(":", 1)[0].lower():
+            raise HTTPException(status_code=400, detail="That domain serves this site itself")
+        if db.query(LeaderProfile.id).filter(LeaderProfile.hostname == hostname, LeaderProfile.id != leader.id).first():
+            raise HTTPException(status_code=409, detail="That domain belongs to another campaign")
+        leader.hostname = hostname
     leader.name = payload.name
     leader.position = payload.position
     leader.achievements = payload.achievements
@@ -1329,58 +2994,343 @@ def save_profile(payload: LeaderProfileUpdate, db: Session = Depends(get_db)):
     leader.slogan = payload.slogan
     leader.campaign_color = payload.campaign_color
     db.commit()
+    snapshot = publish_leader(leader)
+    # Render, compress and generate questions now rather than on the next student's request
+    student_page(snapshot)
+    get_question_bank(db, snapshot)
+    db.query(QuestionBank).filter(
+        QuestionBank.campaign_id == snapshot.id, QuestionBank.version != snapshot.version
+    ).delete()
+    db.commit()
+    load_campaign_routes(db)
     return {"message": "Profile saved successfully"}
 
 
-@app.get("/questions")
-def get_questions(level: int = 1, db: Session = Depends(get_db)):
-    leader = get_leader(db)
-    return generate_campaign_questions(leader, level)
-
-
-@app.post("/register")
-def register(payload: UserCreate, db: Session = Depends(get_db)):
-    user = User(
-        id=uuid.uuid4(),
-        name=payload.name,
-        phone=payload.phone,
-        referral_code=generate_referral_code(),
-        referred_by=payload.referred_by,
-    )
-    db.add(user)
+@campaign_routes.get("/questions")
+def get_questions(request: Request, level: int = 1, variant: int | None = None, v: str | None = None,
+                  campaign_id: int = Depends(resolve_campaign), db: Session = Depends(get_db)):
+    """Serve a stored question set.
+
+    With ?variant= the response is deterministic and cacheable by URL; when the
+    URL also pins the current profile version (?v=) it never changes at all.
+    """
+    leader = get_leader(db, campaign_id)
+    sets = get_question_bank(db, leader).get(level)
+    if not sets:
+        return generate_campaign_questions(leader, level)
+    if variant is None:
+        variant = random.randrange(len(sets))
+        response = sets[variant].respond(request, cache_control="no-store")
+    else:
+        variant %= len(sets)
+        response = sets[variant].respond(request, cache_control=IMMUTABLE if v == leader.version else None)
+    response.headers["X-Question-Variant"] = str(variant)
+    return response
+
+
+@campaign_routes.get("/questions/all")
+def get_all_questions(request: Request, variant: int | None = None, v: str | None = None,
+                      campaign_id: int = Depends(resolve_campaign), db: Session = Depends(get_db)):
+    """Every level's question set in a single response, for the page to prefetch."""
+    leader = get_leader(db, campaign_id)
+    bank = get_question_bank(db, leader)
+    if variant is None:
+        variant = random.randrange(QUESTION_BANK_SIZE)
+    variant %= QUESTION_BANK_SIZE
+    page = cached(leader, f"questions_all:{variant}", lambda: all_levels_page(bank, variant))
+    response = page.respond(request, cache_control=IMMUTABLE if v == leader.version else None)
+    response.headers["X-Question-Variant"] = str(variant)
+    return response
+
+
+@campaign_routes.post("/questions/seen")
+def question_variant_seen(user_id: str, level: int, variant: int,
+                          campaign_id: int = Depends(resolve_campaign), db: Session = Depends(get_db)):
+    """Record that a user started a level with this bank variant; sent once per level start.
+
+    The sets themselves are fetched by URL and stay cacheable; this is the only
+    write, and the next /register for the user continues after it.
+    """
+    try:
+        user_uuid = uuid.UUID(registrations.resolve(str(uuid.UUID(user_id))))  # a merged row's id: the stored user
+    except ValueError:
+        raise HTTPException(404, "User not found")
+    if level not in (1, 2, 3) or not 0 <= variant < QUESTION_BANK_SIZE:
+        raise HTTPException(400, "Unknown level or variant")
+    leader = get_leader(db, campaign_id)
+    if REGISTER_FLUSH_MS > 0 and mark_buffered_variant_seen(leader, str(user_uuid), level, variant):
+        return {"level": level, "variant": variant}
+    if not mark_variant_seen(db, leader, user_uuid, level, variant):
+        raise HTTPException(404, "User not found")
     db.commit()
-    db.refresh(user)
+    return {"level": level, "variant": variant}
 
-    if payload.referred_by:
-        ref = db.query(User).filter(User.referral_code == payload.referred_by).first()
-        if ref:
-            ref.retries_left += 1
-            db.commit()
 
+def registered_user(user, leader: LeaderSnapshot) -> dict:
     return {
         "id": str(user.id), "name": user.name,
-        "referral_code": user.referral_code, "retries_left": user.retries_left
+        "referral_code": user.referral_code, "retries_left": user.retries_left,
+        "variants": next_variants(leader, str(user.id), user.seen_questions, user.seen_version),
     }
 
 
-@app.get("/leaderboard")
-def leaderboard(db: Session = Depends(get_db)):
-    users = (
-        db.query(User)
-        .filter(User.eligible_for_leaderboard == True)  # noqa
-        .order_by(User.score.desc())
-        .limit(10)
-        .all()
+def buffered_user(row: dict, leader: LeaderSnapshot) -> dict:
+    """registered_user for a row still in the registration buffer."""
+    seen = bytes.fromhex(row["seen_questions"]) if row.get("seen_questions") else None
+    return {
+        "id": row["id"], "name": row["name"],
+        "referral_code": row["referral_code"], "retries_left": User.retries_left.default.arg,
+        "variants": next_variants(leader, row["id"], seen, row.get("seen_version")),
+    }
+
+
+@campaign_routes.post("/register")
+def register(payload: UserCreate, campaign_id: int = Depends(resolve_campaign), db: Session = Depends(get_db)):
+    """Register a phone number once per campaign; repeats get the existing user back.
+
+    A repeat costs one lookup on the (campaign_id, phone_e164) unique index. A new
+    user is inserted, returning the generated fields, and the referrer's retry is
+    added with retries_left + 1 in SQL, all in one transaction, so simultaneous
+    sign-ups with one code all count. With REGISTER_FLUSH_MS set the row is only
+    journaled and buffered here, and written with the next batch; a full buffer
+    falls back to the direct insert. Every response carries, per level, the
+    question variants the user should play next, in order (next_variants).
+    """
+    phone = normalize_phone(payload.phone)
+    leader = get_leader(db, campaign_id)
+    returning = (User.id, User.name, User.referral_code, User.retries_left, User.seen_questions, User.seen_version)
+    if REGISTER_FLUSH_MS > 0:
+        row = registrations.find(campaign_id, phone)
+        if row is not None:
+            return buffered_user(row, leader)
+    existing = db.query(*returning).filter(User.campaign_id == campaign_id, User.phone_e164 == phone).first()
+    if existing is not None:
+        return registered_user(existing, leader)
+
+    if REGISTER_FLUSH_MS > 0:
+        row = {
+            "id": str(uuid.uuid4()), "name": payload.name, "phone": payload.phone, "phone_e164": phone,
+            "referral_code": generate_referral_code(db), "referred_by": payload.referred_by,
+            "campaign_id": campaign_id, "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        buffered = registrations.add(row)
+        if buffered is row:
+            best_scores.put(row["id"], 0)
+        if buffered is not None:  # this row, or one a concurrent tap buffered first
+            return buffered_user(buffered, leader)
+
+    user = db.execute(
+        pg_insert(User)
+        .values(
+            id=uuid.uuid4(),
+            name=payload.name,
+            phone=payload.phone,
+            phone_e164=phone,
+            referral_code=generate_referral_code(db),
+            referred_by=payload.referred_by,
+            campaign_id=campaign_id,
+        )
+        .on_conflict_do_nothing(index_elements=[User.campaign_id, User.phone_e164])
+        .returning(*returning)
+    ).first()
+    if user is None:  # registered by a concurrent request since the lookup
+        db.rollback()
+        return registered_user(
+            db.query(*returning).filter(User.campaign_id == campaign_id, User.phone_e164 == phone).one(), leader
+        )
+    if payload.referred_by:
+        db.execute(
+            update(User)
+            .where(User.referral_code == payload.referred_by, User.campaign_id == campaign_id)
+            .values(retries_left=User.retries_left + 1)
+        )
+    db.commit()
+    best_scores.put(str(user.id), 0)  # so this worker's first score submission needs no lookup
+    return registered_user(user, leader)
+
+
+@campaign_routes.get("/leaderboard")
+def leaderboard(campaign_id: int = Depends(resolve_campaign), db: Session = Depends(get_db)):
+    return Response(leaderboard_body(db, campaign_id), media_type="application/json")
+
+
+@campaign_routes.get("/leaderboard/full")
+def leaderboard_page(limit: int = 100, cursor: str | None = None,
+                     campaign_id: int = Depends(resolve_campaign), db: Session = Depends(get_db)):
+    """The whole leaderboard, a page at a time, for campaign staff.
+
+    Pages are keyset-paginated on ix_users_board: a page starts right after the
+    cursor's (score, id), so page 5,000 costs the same index descent as page 1.
+    Follow "next" until it is null.
+    """
+    limit = max(1, min(limit, 1000))
+    query = db.query(User.id, User.name, User.score).filter(*on_board(campaign_id))
+    rank = 0
+    if cursor:
+        score, user_id, rank = decode_cursor(cursor)
+        query = query.filter(tuple_(User.score, User.id) < tuple_(score, user_id))
+    rows = query.order_by(User.score.desc(), User.id.desc()).limit(limit).all()
+    entries = [{"rank": rank + i + 1, "name": name, "score": score} for i, (_, name, score) in enumerate(rows)]
+    next_cursor = None
+    if len(rows) == limit:
+        last = rows[-1]
+        next_cursor = encode_cursor(last.score, last.id, rank + len(rows))
+    return {"entries": entries, "next": next_cursor}
+
+
+@campaign_routes.get("/rank/{user_id}")
+def user_rank(user_id: str, around: int = 2, campaign_id: int = Depends(resolve_campaign), db: Session = Depends(get_db)):
+    """The user's exact position on the full leaderboard and the entries just around it.
+
+    Position is one plus an index-only count of the users ahead in (score, id)
+    order, and the neighbours are two short keyset scans, all on ix_users_board.
+    A user not yet eligible gets the position they would take; that includes one
+    still in the registration buffer, whose row is read from there.
+    """
+    try:
+        user_id = uuid.UUID(registrations.resolve(str(uuid.UUID(user_id))))  # a merged row's id: the stored user
+    except ValueError:
+        raise HTTPException(404, "User not found")
+    row = registrations.get(str(user_id)) if REGISTER_FLUSH_MS > 0 else None
+    if row is not None and row["campaign_id"] == campaign_id:
+        user = User(id=user_id, name=row["name"], score=row.get("score", 0), eligible_for_leaderboard=False)
+    else:
+        user = (
+            db.query(User.id, User.name, User.score, User.eligible_for_leaderboard)
+            .filter(User.id == user_id, User.campaign_id == campaign_id)
+            .first()
+        )
+    if user is None:
+        raise HTTPException(404, "User not found")
+    around = max(0, min(around, 10))
+    position = tuple_(User.score, User.id)
+    me = tuple_(user.score or 0, user.id)
+
+    ahead = db.query(func.count()).filter(*on_board(campaign_id), position > me).scalar()
+    above = (
+        db.query(User.name, User.score).filter(*on_board(campaign_id), position > me)
+        .order_by(User.score, User.id).limit(around).all()
+    )
+    below = (
+        db.query(User.name, User.score).filter(*on_board(campaign_id), position < me)
+        .order_by(User.score.desc(), User.id.desc()).limit(around).all()
     )
-    return [{"rank": i+1, "name": u.name, "score": u.score} for i, u in enumerate(users)]
+    rank = ahead + 1
+    first_below = rank + 1 if user.eligible_for_leaderboard else rank
+    return {
+        "rank": rank, "name": user.name, "score": user.score or 0, "eligible": user.eligible_for_leaderboard,
+        "above": [{"rank": rank - i - 1, "name": name, "score": score} for i, (name, score) in enumerate(above)][::-1],
+        "below": [{"rank": first_below + i, "name": name, "score": score} for i, (name, score) in enumerate(below)],
+    }
 
 
-@app.post("/submit-score")
+@campaign_routes.post("/submit-score")
 def submit_score(user_id: str, score: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    """Raise the user's best score in one atomic statement.
+
+    A score at or below the cached best returns without touching the database.
+    With SCORE_FLUSH_MS set, a higher score is coalesced into score_buffer and
+    written with the next batch; only a user not seen yet costs a lookup. A user
+    still in the registration buffer has the score amended into their buffered row.
+    """
+    try:
+        user_id = registrations.resolve(str(uuid.UUID(user_id)))
+    except ValueError:
         raise HTTPException(404, "User not found")
-    if score > user.score:
-        user.score = score
-        db.commit()
-    return {"score": user.score}
+    best = best_scores.get(user_id)
+    if best is not None and score <= best:
+        return {"score": best}
+
+    if REGISTER_FLUSH_MS > 0:  # not in the database yet: the score goes into the buffered row
+        row = registrations.amend(user_id, lambda row: row.update(score=max(row.get("score", 0), score)))
+        if row is not None:
+            best_scores.put(user_id, row["score"])
+            return {"score": row["score"]}
+    if SCORE_FLUSH_MS > 0:
+        if best is None:
+            user = db.query(User.score).filter(User.id == user_id).first()
+            if user is None:
+                raise HTTPException(404, "User not found")
+            best = user.score or 0
+        if score > best:
+            score_buffer.add(user_id, score)
+            best = score
+        best_scores.put(user_id, best)
+        return {"score": best}
+
+    row = db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(score=func.greatest(User.score, score))
+        .returning(User.campaign_id, User.id, User.name, User.score, User.eligible_for_leaderboard)
+    ).first()
+    if row is None:
+        raise HTTPException(404, "User not found")
+    db.commit()
+    best_scores.put(user_id, row.score)
+    offer_scores([row])
+    return {"score": row.score}
+
+
+app.include_router(campaign_routes)
+app.include_router(campaign_routes, prefix="/c/{slug}")
+
+
+# ─── STATIC EXPORT ────────────────────────────────────────────────────────────
+def write_prepared(path: str, page: PreparedPage):
+    """Write the body plus .gz/.br siblings for hosts that serve precompressed files."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    suffixes = {"identity": "", "gzip": ".gz", "br": ".br"}
+    for coding, (body, _) in page.variants.items():
+        with open(path + suffixes[coding], "wb") as f:
+            f.write(body)
+
+
+def export_static_site(out_dir: str, api_base: str, slug: str | None = None):
+    """Write the page, assets and the stored question bank, so CDN and app serve the same sets.
+
+    The page calls `api_base` for /register, /submit-score, /leaderboard,
+    /rank/{id} and POST /questions/seen; questions come from the exported files.
+    """
+    if not SessionLocal:
+        raise SystemExit("DATABASE_URL is not configured")
+    db = SessionLocal()
+    try:
+        campaign_id = DEFAULT_CAMPAIGN_ID
+        if slug:
+            campaign_id = load_campaign_routes(db).slugs.get(slug.lower())
+            if campaign_id is None:
+                raise SystemExit(f"No campaign with slug {slug!r}")
+        leader = get_leader(db, campaign_id)
+        bank = get_question_bank(db, leader)
+    finally:
+        db.close()
+
+    variants = min(len(sets) for sets in bank.values())
+    api_base = api_base.rstrip("/") + (f"/c/{leader.slug}" if leader.slug else "")
+    html = build_student_html(leader, api_base=api_base,
+                              question_bank={"path": "/questions", "variants": variants})
+    write_prepared(os.path.join(out_dir, "index.html"), PreparedPage(html))
+    for filename, asset in STATIC_ASSETS.items():
+        write_prepared(os.path.join(out_dir, "static", filename), asset)
+    for level, sets in bank.items():
+        for variant, questions in enumerate(sets[:variants]):
+            write_prepared(os.path.join(out_dir, "questions", f"level-{level}", f"{variant}.json"), questions)
+    print(f"Exported {leader.name or 'campaign'} quiz to {out_dir} ({variants} question sets per level)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="QuizRush campaign tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="render the quiz as a static site for CDN hosting")
+    export.add_argument("out_dir")
+    export.add_argument("--api-base", default="", help="origin serving /register, /submit-score, /leaderboard, /rank and /questions/seen")
+    export.add_argument("--campaign", metavar="SLUG", help="campaign to export (default: the default campaign)")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        export_static_site(args.out_dir, args.api_base, args.campaign)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Checks for the pure helpers in main.py; none of them needs a database.
+
+  python -m pytest -q
+"""
+
+import json, random, re, uuid
+
+import pytest
+
+import main
+
+
+# ─── PROFILE PARSING ──────────────────────────────────────────────────────────
+OLD_SENTENCE_BREAKS = re.compile(r'[.!?]+|,{2,}')
+
+
+def old_parse_bullets(text: str) -> list:
+    """parse_bullets as it was before iter_bullets: three full passes, then dedup."""
+    items = []
+    for line in text.splitlines():
+        line = line.strip().lstrip("-•*0123456789.)").strip()
+        if len(line) > 20:
+            items.append(line)
+    if len(items) < 2:
+        for s in OLD_SENTENCE_BREAKS.split(text):
+            s = s.strip().lstrip("-•*").strip()
+            if len(s) > 20:
+                items.append(s)
+    if len(items) < 2:
+        for p in text.split(","):
+            p = p.strip()
+            if len(p) > 20:
+                items.append(p)
+    seen, unique = set(), []
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            unique.append(item)
+    return unique
+
+
+PROFILE_TEXTS = [
+    "",
+    "Short.",
+    "- Built a new library for the faculty\n- Secured 20 scholarships for first years\n- Fixed hostel water supply",
+    "1. Organised the first inter-hall debate\n2) Negotiated lower printing fees\n3. Ran the freshers' week",
+    "Led the SRC finance committee for two years. Audited every club budget! Published the accounts?",
+    "One qualifying line that is long enough\nshort\nThen sentences follow. Each of them is long enough to count.",
+    "Improved campus shuttle frequency, extended library opening hours, introduced a mental health desk",
+    "no breaks at all but a single very long paragraph without punctuation marks",
+    "Repeated achievement that is long enough\nRepeated achievement that is long enough\nAnother long enough line here",
+    "Windows line endings are handled too\r\nSecond line with enough characters\r\n",
+    "Unicode line separators count as lines and so does this second one here third",
+    "Double commas,, act as sentence breaks in the old parser,, and still count as breaks here",
+    "* Bullet with trailing spaces that is long   \n\n\n•   Another bullet that is long enough   \n",
+    "Same sentence that is long enough. Same sentence that is long enough. Different sentence long enough.",
+    "Mixed: one line only that qualifies for sure. But then, sentences, commas, and more text follow on",
+]
+
+
+def test_iter_bullets_matches_old_parser():
+    for text in PROFILE_TEXTS:
+        assert main.parse_bullets(text, max_chars=10**9, max_items=10**9) == old_parse_bullets(text), text
+
+
+def test_iter_bullets_matches_old_parser_on_random_text():
+    rng = random.Random(11)
+    alphabet = ["word ", "longer words ", ". ", "! ", ",", ",, ", "\n", "\r\n", "\u2028", "- ", "• ", "3) ", "  "]
+    for _ in range(2000):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randrange(40)))
+        assert main.parse_bullets(text, max_chars=10**9, max_items=10**9) == old_parse_bullets(text), repr(text)
+
+
+def test_iter_bullets_caps():
+    for text in PROFILE_TEXTS:
+        full = old_parse_bullets(text)
+        assert main.parse_bullets(text, max_items=2) == full[:2], text
+        assert main.parse_bullets(text, max_chars=40, max_items=10**9) == old_parse_bullets(text[:40]), text
+
+
+# ─── QUESTION SEQUENCING ──────────────────────────────────────────────────────
+def test_take_unseen_never_repeats_within_a_round():
+    rng = random.Random(15)
+    for size in (5, 7, 12, 30, 64):
+        order = rng.sample(range(size), size)
+        offset = rng.randrange(3) * size  # another level's bits sit below this one's
+        other_levels = (1 << offset) - 1
+        seen, served = other_levels, []
+        for _ in range(4 * size):
+            picks, seen = main.take_unseen(order, offset, seen)
+            assert len(set(picks)) == len(picks) == 5
+            assert seen & other_levels == other_levels and seen >> (offset + size) == 0
+            served.extend(picks)
+        last = {}
+        for position, item in enumerate(served):  # between two servings of an item, every other one is served
+            if item in last:
+                assert set(served[last[item] + 1:position]) == set(range(size)) - {item}, (size, position)
+            last[item] = position
+        assert served[:size] and sorted(served[:size]) == list(range(size))
+
+
+def test_take_unseen_cycles_a_small_pool():
+    picks, seen = main.take_unseen([2, 0, 1], 0, 0)
+    assert picks == [2, 0, 1, 2, 0]
+
+
+def leader_with_pool(size: int) -> main.LeaderSnapshot:
+    achievements = "\n".join(f"Delivered campus project number {i} for the students" for i in range(size))
+    return main.LeaderSnapshot(1, "Ama", "SRC President", achievements, "", "", "#e63946", "", None, f"pool-{size}")
+
+
+def test_next_variants_does_not_repeat_items_until_the_pool_is_used():
+    for size in (6, 12, 17, 30, 64, 101):
+        leader = leader_with_pool(size)
+        compiled = main.compile_campaign(leader)[1]
+        assert len(compiled.answers) == size
+        picks = main.bank_picks(leader, 1, compiled)
+        for n in range(40):
+            user_id = str(uuid.UUID(int=n))
+            seen, played, served = 0, [], []
+            for _ in range(main.QUESTION_BANK_SIZE):
+                walk = main.next_variants(leader, user_id, seen.to_bytes(main.SEEN_BYTES, "little"), leader.version)[1]
+                assert sorted(walk) == list(range(main.QUESTION_BANK_SIZE))
+                played.append(walk[0])
+                seen |= 1 << walk[0]
+                served.append(set(picks[walk[0]]))
+            assert sorted(played) == list(range(main.QUESTION_BANK_SIZE))  # every variant once before any again
+            fresh = min(size // main.QUESTIONS_PER_SET, main.QUESTION_BANK_SIZE)
+            first_round = served[:fresh]  # as many sets as fit in the pool, whichever variant the user starts at
+            assert len(set().union(*first_round)) == fresh * main.QUESTIONS_PER_SET, (size, user_id)
+            if size in (12, 17, 30, 64):  # and here no set shares an item with the one before it
+                assert all(not a & b for a, b in zip(served, served[1:])), (size, user_id)
+
+
+# ─── REFERRAL CODES ───────────────────────────────────────────────────────────
+def test_referral_code_is_injective():
+    key = bytes(range(32))
+    serials = list(range(50_000)) + list(range(main.REFERRAL_HALF ** 2 - 1000, main.REFERRAL_HALF ** 2))
+    codes = [main.referral_code(serial, key) for serial in serials]
+    assert len(set(codes)) == len(codes)
+    assert all(len(code) == 8 and set(code) <= set(main.REFERRAL_ALPHABET) for code in codes)
+
+
+def test_referral_code_depends_on_the_key():
+    one, other = b"\x01" * 32, b"\x02" * 32
+    assert main.referral_code(7, one) == main.referral_code(7, one)
+    assert sum(main.referral_code(n, one) == main.referral_code(n, other) for n in range(1000)) == 0
+
+
+# ─── LEADERBOARD ──────────────────────────────────────────────────────────────
+def reference_board(scores: dict, names: dict, keep: int) -> list:
+    """Every known user sorted the way ix_users_board orders them, cut to `keep`."""
+    ranked = sorted(scores, key=lambda user_id: (scores[user_id], uuid.UUID(user_id).int), reverse=True)
+    return [(user_id, names[user_id], scores[user_id]) for user_id in ranked[:keep]]
+
+
+def test_leaderboard_offer_matches_a_full_sort():
+    rng = random.Random(22)
+    for keep, users in ((5, 3), (10, 40), (25, 200)):
+        names = {str(uuid.UUID(int=rng.getrandbits(128))): f"Student {i}" for i in range(users)}
+        ids = list(names)
+        scores = {user_id: rng.randrange(50) for user_id in ids[:users // 2]}  # already in the database
+        board = main.Leaderboard(reference_board(scores, names, keep), keep)
+        for _ in range(20 * users):
+            user_id = rng.choice(ids)
+            best = max(scores.get(user_id, 0), rng.randrange(100))  # offers only ever carry a new best
+            scores[user_id] = best
+            board.offer(user_id, names[user_id], best)
+            assert [(u, n, -s) for s, _, u, n in board.entries] == reference_board(scores, names, keep)
+        top = reference_board(scores, names, min(keep, main.LEADERBOARD_TOP))
+        assert json.loads(board.response()) == [
+            {"rank": i + 1, "name": name, "score": score} for i, (_, name, score) in enumerate(top)
+        ]
+
+
+
+# ─── PHONE NUMBERS ────────────────────────────────────────────────────────────
+def test_normalize_phone_spellings_of_one_number():
+    for phone in ("024 412 3456", "24 412 3456", "233244123456", "2330244123456", "+233 24 412 3456",
+                  "+233 (0)24 412-3456", "00233244123456"):
+        assert main.normalize_phone(phone) == "+233244123456", phone
+    assert main.normalize_phone("+44 20 7946 0958") == main.normalize_phone("0044 20 7946 0958") == "+442079460958"
+
+
+def test_normalize_phone_rejects_wrong_lengths():
+    for phone in ("", "12345", "0244123", "02441234567", "2331234567", "23324412345", "+2332331234567",
+                  "+233 24 412 345", "+1 234", "+1234567890123456", "not a number"):
+        with pytest.raises(main.HTTPException):
+            main.normalize_phone(phone)